@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import re
+import time
+from collections import deque
+
+# Outcomes of an agent run, as stored in agent_status
+COMPLETED = "completed"
+LOOPED = "looped"
+BUDGET_EXCEEDED = "budget_exceeded"
+
+DEFAULT_BUDGET = {
+    "wall_time_s": float(os.environ.get("AGENT_MAX_WALL_TIME_S", 1800)),
+    "tokens": int(os.environ.get("AGENT_MAX_TOKENS", 250000)),
+    "tool_calls": int(os.environ.get("AGENT_MAX_TOOL_CALLS", 150)),
+    "iterations": int(os.environ.get("AGENT_MAX_ITERATIONS", 50)),
+}
+
+# The same call with the same output this many times within the last LOOP_WINDOW calls counts as a loop.
+# A repeated call that answers differently, e.g. a rerun after a fix, is progress.
+MAX_REPEATED_CALLS = int(os.environ.get("AGENT_MAX_REPEATED_CALLS", 3))
+LOOP_WINDOW = 8
+# This many identical tool outputs in a row count as a loop
+MAX_REPEATED_OUTPUTS = int(os.environ.get("AGENT_MAX_REPEATED_OUTPUTS", 4))
+# write_file always answers "ok", identical outputs from it say nothing about progress
+OUTPUT_LOOP_IGNORED_TOOLS = {"write_file"}
+# Outputs are compared with numbers masked, a rerun that only differs in timings or PIDs is the same output
+NUMBERS = re.compile(r"\d+")
+
+
+def task_budget(task: dict) -> dict:
+    """The default budget with the task's own "budget" overrides from the manifest."""
+    return {**DEFAULT_BUDGET, **task.get("budget", {})}
+
+
+def _digest(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class AgentGuard:
+    """
+    Tracks what an agent run has spent and stops it when it is over budget or stuck.
+
+    The agent loop asks `start_iteration` before every LLM turn and reports every
+    response and tool call. `stop_status` is set to BUDGET_EXCEEDED or LOOPED (with a
+    human readable `stop_reason`) as soon as a limit is hit, and the loop ends there.
+    """
+
+    def __init__(self, budget: dict = None):
+        self.budget = budget or dict(DEFAULT_BUDGET)
+        self.start = time.monotonic()
+        self.iterations = 0
+        self.tool_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.stop_status = None
+        self.stop_reason = None
+        self._recent_calls = deque(maxlen=LOOP_WINDOW)
+        self._last_output = None
+        self._output_repeats = 0
+
+    @property
+    def tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start
+
+    def _stop(self, status: str, reason: str):
+        if self.stop_status is None:
+            self.stop_status = status
+            self.stop_reason = reason
+
+    def record_llm(self, response):
+        self.iterations += 1
+        self.prompt_tokens += response.get("prompt_eval_count") or 0
+        self.completion_tokens += response.get("eval_count") or 0
+        self.check_budget()
+
+    def record_tool(self, name: str, arguments: dict, output: str):
+        self.tool_calls += 1
+
+        output_digest = _digest(NUMBERS.sub("#", output))
+        call = _digest([name, arguments, output_digest])
+        self._recent_calls.append(call)
+        repeats = self._recent_calls.count(call)
+        if repeats >= MAX_REPEATED_CALLS:
+            self._stop(LOOPED, f"{name} called {repeats} times with the same arguments and output in the last {len(self._recent_calls)} calls")
+
+        if name not in OUTPUT_LOOP_IGNORED_TOOLS and output.strip():
+            self._output_repeats = self._output_repeats + 1 if output_digest == self._last_output else 1
+            self._last_output = output_digest
+            if self._output_repeats >= MAX_REPEATED_OUTPUTS:
+                self._stop(LOOPED, f"The last {self._output_repeats} tool calls returned the same output")
+
+        self.check_budget()
+
+    def check_budget(self):
+        if self.elapsed() > self.budget["wall_time_s"]:
+            self._stop(BUDGET_EXCEEDED, f"Wall time over {self.budget['wall_time_s']:.0f}s")
+        elif self.tokens > self.budget["tokens"]:
+            self._stop(BUDGET_EXCEEDED, f"{self.tokens} tokens used, budget is {self.budget['tokens']}")
+        elif self.tool_calls > self.budget["tool_calls"]:
+            self._stop(BUDGET_EXCEEDED, f"{self.tool_calls} tool calls, budget is {self.budget['tool_calls']}")
+
+    def start_iteration(self) -> bool:
+        """Whether another LLM turn may start."""
+        self.check_budget()
+        if self.iterations >= self.budget["iterations"]:
+            self._stop(BUDGET_EXCEEDED, f"Reached {self.budget['iterations']} iterations")
+        return self.stop_status is None
+
+    def usage(self) -> dict:
+        return {
+            "iterations": self.iterations,
+            "tool_calls": self.tool_calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "wall_time_s": round(self.elapsed(), 1)
+        }
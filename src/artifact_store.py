@@ -0,0 +1,175 @@
+import fcntl
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+ARTIFACTS_DIR = Path(os.environ.get("ARTIFACTS_DIR", Path(__file__).parent / "artifacts"))
+ARTIFACT_MAX_BYTES = int(os.environ.get("ARTIFACT_MAX_BYTES", 1024 ** 3))
+ARTIFACT_MAX_AGE_DAYS = float(os.environ.get("ARTIFACT_MAX_AGE_DAYS", 30))
+CHUNK_SIZE = 1024 * 1024
+# gzip's default of 9 costs a lot of time for little gain on logs and reports
+COMPRESS_LEVEL = 6
+
+
+class ArtifactStore:
+    """
+    Content-addressed, gzip-compressed storage for run artifacts.
+
+    Objects live in objects/<sha[:2]>/<sha>.gz, keyed by the SHA-256 of the uncompressed
+    content, so identical outputs are stored once. index.jsonl holds one line per stored
+    artifact linking a digest to its name, kind, scoreboard run and task. Retention drops
+    index entries by age and total size, then deletes objects nothing refers to anymore.
+    """
+
+    def __init__(self, root: Path = ARTIFACTS_DIR):
+        self.root = Path(root)
+        self.objects_dir = self.root / "objects"
+        self.index_file = self.root / "index.jsonl"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+
+    @contextmanager
+    def _locked(self):
+        # The dashboard and the MCP server share the store, so lock across processes
+        with open(self.root / ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / f"{digest}.gz"
+
+    def scratch_path(self, suffix: str = "") -> Path:
+        """A temporary file inside the store, for tools that can only write to a path."""
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=self.root)
+        os.close(fd)
+        return Path(path)
+
+    def put_file(self, src: Path, name: str, kind: str, run_id: str = None, task_name: str = None,
+                 remove_source: bool = True) -> dict:
+        """Store a file by streaming it through the hash and the compressor."""
+        with open(src, "rb") as f:
+            entry = self._put_stream(f, name, kind, run_id, task_name)
+        if remove_source:
+            os.unlink(src)
+        return entry
+
+    def put_text(self, text: str, name: str, kind: str, run_id: str = None, task_name: str = None) -> dict:
+        with tempfile.SpooledTemporaryFile(max_size=CHUNK_SIZE) as f:
+            f.write(text.encode("utf-8"))
+            f.seek(0)
+            return self._put_stream(f, name, kind, run_id, task_name)
+
+    def _put_stream(self, stream, name, kind, run_id, task_name) -> dict:
+        sha = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(suffix=".gz.tmp", dir=self.objects_dir)
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=COMPRESS_LEVEL, mtime=0) as gz:
+                while chunk := stream.read(CHUNK_SIZE):
+                    sha.update(chunk)
+                    gz.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        digest = sha.hexdigest()
+        target = self.object_path(digest)
+        entry = {
+            "digest": digest,
+            "name": name,
+            "kind": kind,
+            "run_id": run_id,
+            "task_name": task_name,
+            "size": size,
+            "created": datetime.now().isoformat()
+        }
+        # Publishing the object and its index entry together keeps retention from
+        # collecting an object between the two
+        with self._locked():
+            if target.exists():
+                os.unlink(tmp_path)
+            else:
+                target.parent.mkdir(exist_ok=True)
+                os.replace(tmp_path, target)
+            entry["stored_size"] = target.stat().st_size
+            with open(self.index_file, "a") as index:
+                index.write(json.dumps(entry) + "\n")
+        return entry
+
+    def open(self, digest: str, mode: str = "rt"):
+        """Open an artifact for streaming reads, decompressing on the fly."""
+        return gzip.open(self.object_path(digest), mode, encoding="utf-8" if "t" in mode else None)
+
+    def read_text(self, digest: str) -> str:
+        with self.open(digest) as f:
+            return f.read()
+
+    def entries(self, run_id: str = None) -> list:
+        if not self.index_file.exists():
+            return []
+        with open(self.index_file) as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        return [e for e in entries if run_id is None or e["run_id"] == run_id]
+
+    def enforce_retention(self, max_bytes: int = ARTIFACT_MAX_BYTES, max_age_days: float = ARTIFACT_MAX_AGE_DAYS) -> dict:
+        """
+        Drop index entries older than max_age_days, then the oldest runs' entries until the
+        stored objects fit in max_bytes, and delete objects no remaining entry refers to.
+        """
+        with self._locked():
+            entries = self.entries()
+            cutoff = time.time() - max_age_days * 86400
+            kept = [e for e in entries if datetime.fromisoformat(e["created"]).timestamp() >= cutoff]
+
+            # Deduplicated objects count once, however many entries point at them
+            def stored_bytes(items):
+                return sum({e["digest"]: e["stored_size"] for e in items}.values())
+
+            kept.sort(key=lambda e: e["created"])
+            while kept and stored_bytes(kept) > max_bytes:
+                oldest_run = kept[0]["run_id"]
+                kept = [e for e in kept if e["run_id"] != oldest_run] if oldest_run else kept[1:]
+
+            tmp_index = self.index_file.with_suffix(".tmp")
+            with open(tmp_index, "w") as f:
+                for entry in kept:
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(tmp_index, self.index_file)
+
+            referenced = {e["digest"] for e in kept}
+            removed_objects = 0
+            freed = 0
+            for path in self.objects_dir.glob("*/*.gz"):
+                if path.name[:-3] not in referenced:
+                    freed += path.stat().st_size
+                    path.unlink()
+                    removed_objects += 1
+
+        result = {
+            "removed_entries": len(entries) - len(kept),
+            "removed_objects": removed_objects,
+            "freed_bytes": freed
+        }
+        if removed_objects or result["removed_entries"]:
+            logging.info(f"Artifact retention: {result}")
+        return result
+
+    def migrate_legacy(self):
+        """Move loose files left in the artifacts folder by older versions into the store."""
+        for path in self.root.iterdir():
+            if path.is_file() and path.name.startswith("newman-"):
+                kind = "report" if path.suffix == ".json" else path.stem.rsplit("-", 1)[-1]
+                self.put_file(path, path.name, kind)
+
+
+store = ArtifactStore()
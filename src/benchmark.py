@@ -0,0 +1,83 @@
+"""
+Headless benchmark runs, for cron jobs and CI. Runs the same pipeline as the dashboard
+(agent, then newman, then the scoreboard) and streams progress to stdout as JSON Lines,
+one engine event per line. Logs go to stderr.
+
+Exits with 1 when a task could not be benchmarked: the agent errored or the tests did not
+complete (skipped, timed out or errored). Failing tests are a result, not a failure of the run.
+
+Run from src/:
+    python benchmark.py --model qwen3                          # every task
+    python benchmark.py --model qwen3 --task login-page --task 1 --concurrency 2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from datetime import datetime
+from engine import run_benchmark
+from live_tests import LIVE_TESTS
+from task_registry import registry
+
+
+def print_event(event: dict):
+    print(json.dumps({"time": datetime.now().isoformat(), **event}, default=str), flush=True)
+
+
+def resolve_tasks(selected: list) -> list:
+    """Task numbers for the --task values, which may be task names or numbers."""
+    tasks = registry.all()
+    if not selected:
+        return list(range(len(tasks)))
+
+    names = [task["name"] for task in tasks]
+    task_ids = []
+    for value in selected:
+        if value in names:
+            task_ids.append(names.index(value))
+        elif value.isdigit() and int(value) < len(tasks):
+            task_ids.append(int(value))
+        else:
+            raise ValueError(f"Unknown task: {value} (tasks are {', '.join(names)})")
+    # A task given twice, e.g. by name and by number, runs once: both copies would share one sandbox
+    return list(dict.fromkeys(task_ids))
+
+
+def failed_tasks(results: list) -> list:
+    """Names of the tasks whose agent errored or whose tests did not run to completion."""
+    return [r["task_name"] for r in results if r.get("agent_status") == "error" or r.get("status") != "completed"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark without the dashboard")
+    parser.add_argument("--model", required=True, help="The Ollama model to benchmark")
+    parser.add_argument("--task", action="append", default=[],
+                        help="Task name or number, repeat for several (default: all tasks)")
+    parser.add_argument("--concurrency", type=int, default=1, help="Tasks run at the same time")
+    parser.add_argument("--live-tests", action=argparse.BooleanOptionalAction, default=LIVE_TESTS,
+                        help="Test while the agent works and stop on the first green run")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s [%(levelname)s] %(message)s',
+        stream=sys.stderr
+    )
+
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    try:
+        task_ids = resolve_tasks(args.task)
+    except ValueError as e:
+        parser.error(str(e))
+
+    results = asyncio.run(run_benchmark(task_ids, args.model, args.live_tests, args.concurrency, on_event=print_event))
+    failed = failed_tasks(results)
+    if failed:
+        logging.error(f"Tasks not benchmarked: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Local stand-ins for the services the harness talks to, so benchmarks run offline.
+
+- FakeDockerClient: the subset of docker.DockerClient used by mcp_server.py. exec output
+  is streamed over a real socket using Docker's multiplexed frame format.
+- FakeOllamaServer: an HTTP server answering /api/chat from a scripted list of messages.
+- DummyApp: a tiny HTTP app with a /health route, standing in for the sandboxed server.
+"""
+import itertools
+import json
+import socket
+import tarfile
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+import docker
+
+
+def docker_frame(payload: bytes, stream_type: int = 1) -> bytes:
+    """Encode a payload as one multiplexed stream frame: [type][000][size][payload]."""
+    return bytes([stream_type, 0, 0, 0]) + len(payload).to_bytes(4, byteorder='big') + payload
+
+
+class FakeExecSocket:
+    """Mimics the object returned by exec_start(socket=True), which exposes the raw socket as _sock."""
+
+    def __init__(self, output: bytes, frame_size: int):
+        self._sock, writer = socket.socketpair()
+        self._writer = threading.Thread(target=self._write, args=(writer, output, frame_size), daemon=True)
+        self._writer.start()
+
+    @staticmethod
+    def _write(writer, output, frame_size):
+        try:
+            for i in range(0, len(output), frame_size):
+                writer.sendall(docker_frame(output[i:i + frame_size]))
+        finally:
+            writer.close()
+
+    def close(self):
+        self._sock.close()
+        self._writer.join()
+
+
+class FakeAPI:
+    def __init__(self, client):
+        self.client = client
+
+    def exec_create(self, container_id, cmd, workdir=None):
+        return {'Id': uuid.uuid4().hex}
+
+    def exec_start(self, exec_id, socket=False):
+        return FakeExecSocket(self.client.exec_output, self.client.frame_size)
+
+
+class FakeContainer:
+    def __init__(self, client, name, ports=None, labels=None):
+        self.client = client
+        self.name = name
+        self.labels = labels or {}
+        self.id = uuid.uuid4().hex
+        self.archived_bytes = 0
+        # Unpublished ports get an ephemeral host port, like the engine assigns
+        self.ports = {
+            container_port: [{"HostIp": "0.0.0.0", "HostPort": str(host_port or 32768 + len(client.containers.by_name))}]
+            for container_port, host_port in (ports or {}).items()
+        }
+
+    def reload(self):
+        pass
+
+    def remove(self, force=False):
+        self.client.containers.by_name.pop(self.name, None)
+
+    def exec_run(self, cmd, **kwargs):
+        return SimpleNamespace(exit_code=0, output=b"")
+
+    def put_archive(self, path, data):
+        # Read the archive back like the engine would, so tar building and transfer are both paid for
+        with tarfile.open(fileobj=data, mode='r') as tar:
+            for member in tar.getmembers():
+                if member.isfile():
+                    self.archived_bytes += len(tar.extractfile(member).read())
+        return True
+
+    def logs(self, tail=50, stderr=True, stdout=True):
+        lines = self.client.exec_output.splitlines()
+        return b"\n".join(lines[-tail:])
+
+
+class FakeContainers:
+    def __init__(self, client):
+        self.client = client
+        self.by_name = {}
+
+    def get(self, name):
+        if name not in self.by_name:
+            raise docker.errors.NotFound(f"No such container: {name}")
+        return self.by_name[name]
+
+    def run(self, image, name=None, ports=None, labels=None, **kwargs):
+        container = FakeContainer(self.client, name, ports, labels)
+        self.by_name[name] = container
+        return container
+
+    def list(self, filters=None):
+        label = (filters or {}).get("label")
+        return [c for c in self.by_name.values() if label is None or label in c.labels]
+
+
+class FakeDockerClient:
+    """
+    Drop-in for docker.from_env() covering what the MCP server calls.
+
+    Args:
+        exec_output (bytes): What every exec streams back.
+        frame_size (int): Payload size of each multiplexed frame.
+        memory_mb (int): The engine's total memory, as reported by info().
+    """
+
+    def __init__(self, exec_output: bytes = b"ok\n", frame_size: int = 1024, memory_mb: int = 16384):
+        self.exec_output = exec_output
+        self.frame_size = frame_size
+        self.memory_mb = memory_mb
+        self.api = FakeAPI(self)
+        self.containers = FakeContainers(self)
+
+    def info(self):
+        return {"ContainersRunning": len(self.containers.by_name), "MemTotal": self.memory_mb * 2 ** 20}
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class _BackgroundServer:
+    handler = _QuietHandler
+
+    def __init__(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler)
+        self.server.owner = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _OllamaHandler(_QuietHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path != "/api/chat":
+            self.send_json(404, {"error": f"unknown path {self.path}"})
+            return
+
+        message = next(self.server.owner.script)
+        self.send_json(200, {
+            "model": request.get("model", "fake"),
+            "created_at": "2024-01-01T00:00:00Z",
+            "message": message,
+            "done": True,
+            "done_reason": "stop",
+            "prompt_eval_count": sum(len(str(m.get("content", ""))) // 4 for m in request.get("messages", [])),
+            "eval_count": len(str(message.get("content", ""))) // 4
+        })
+
+
+class FakeOllamaServer(_BackgroundServer):
+    """
+    Serves /api/chat by replaying the scripted assistant messages in a loop.
+
+    Args:
+        script (list): Assistant messages, e.g. {"role": "assistant", "content": "", "tool_calls": [...]}.
+    """
+    handler = _OllamaHandler
+
+    def __init__(self, script: list):
+        super().__init__()
+        self.script = itertools.cycle(script)
+
+
+class _DummyAppHandler(_QuietHandler):
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, {"status": "healthy"})
+        elif self.path == "/":
+            self.send_response(200)
+            self.send_header("Content-Length", "13")
+            self.end_headers()
+            self.wfile.write(b"Hello, World!")
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        self.send_json(401, {"error": "invalid credentials"})
+
+    do_PUT = do_POST
+    do_DELETE = do_GET
+
+
+class DummyApp(_BackgroundServer):
+    """A minimal HTTP app in place of the server the agent builds in the sandbox."""
+    handler = _DummyAppHandler
+
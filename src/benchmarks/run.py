@@ -0,0 +1,359 @@
+"""
+Harness microbenchmarks against the local fakes in benchmarks/fakes.py. No Docker,
+Ollama or network access is needed.
+
+Run from src/:
+    python -m benchmarks.run                      # run all, compare against baseline.json
+    python -m benchmarks.run --only exec_throughput --iterations 50
+    python -m benchmarks.run --save-baseline      # record the current numbers as the baseline
+
+A benchmark regresses when its p50 latency, or its peak memory where it measures one,
+exceeds the baseline by more than the threshold (the per-benchmark "threshold" in
+baseline.json, else --threshold). The process exits with 1 on any regression. Baselines are machine specific, record them on the machine
+that runs the comparison.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+import docker
+from benchmarks.fakes import DummyApp, FakeDockerClient, FakeOllamaServer
+
+SRC_DIR = Path(__file__).resolve().parent.parent
+BASELINE_FILE = Path(__file__).resolve().parent / "baseline.json"
+DEFAULT_THRESHOLD = 0.5
+
+BENCHMARKS = {}
+
+
+def benchmark(name: str):
+    """Register a benchmark. It receives the iteration count and returns a result dict."""
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+def summarize(samples: list, bytes_per_op: int = 0) -> dict:
+    ordered = sorted(samples)
+    mean = statistics.fmean(ordered)
+    result = {
+        "iterations": len(ordered),
+        "mean_ms": round(mean * 1000, 3),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        "ops_per_s": round(1 / mean, 1) if mean > 0 else None
+    }
+    if bytes_per_op:
+        result["mb_per_s"] = round(bytes_per_op / mean / 1e6, 2)
+    return result
+
+
+def measure(fn, iterations: int, warmup: int = 2) -> list:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def peak_memory_mb(fn) -> float:
+    """Peak Python heap allocated while fn runs, measured on a separate untimed call."""
+    tracemalloc.start()
+    try:
+        fn()
+        return round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+    finally:
+        tracemalloc.stop()
+
+
+async def measure_async(fn, iterations: int, warmup: int = 2) -> list:
+    for _ in range(warmup):
+        await fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+fake_docker = FakeDockerClient()
+bench_workdir = tempfile.TemporaryDirectory(prefix="bench-sandbox-")
+
+
+def load_mcp_server():
+    """Import mcp_server with the fake engine in place of docker.from_env()."""
+    docker.from_env = lambda: fake_docker
+    import mcp_server
+    mcp_server.WORKDIR = bench_workdir.name
+    fake_docker.containers.run("bench", name=mcp_server.CONTAINER_NAME)
+    return mcp_server
+
+
+@benchmark("exec_throughput")
+def bench_exec_throughput(iterations: int) -> dict:
+    """run_in_container parsing 1 MB of multiplexed output in 4 KB frames."""
+    mcp_server = load_mcp_server()
+    line = b"added 1 package, and audited 2 packages in 300ms\n"
+    fake_docker.exec_output = line * (1_000_000 // len(line))
+    fake_docker.frame_size = 4096
+    samples = measure(lambda: mcp_server.run_in_container("npm install"), iterations)
+    return summarize(samples, bytes_per_op=len(fake_docker.exec_output))
+
+
+@benchmark("exec_tool")
+def bench_exec_tool(iterations: int) -> dict:
+    """The exec tool on 1 MB of npm-style output: streaming, compaction and saving the full output."""
+    import output_compaction
+    from artifact_store import ArtifactStore
+
+    mcp_server = load_mcp_server()
+    output_compaction.store = ArtifactStore(Path(bench_workdir.name) / "artifacts")
+    counter = iter(range(10 ** 9))
+
+    def run():
+        # A different first line each time, so the full output is never deduplicated
+        fake_docker.exec_output = f"\x1b[1mrun {next(counter)}\x1b[0m\n".encode() + b"".join(
+            f"\r[{'#' * (i % 20)}] added {i} packages in {i}ms\n".encode() for i in range(20000))
+        mcp_server.exec("npm install")
+
+    fake_docker.frame_size = 4096
+    return summarize(measure(run, iterations))
+
+
+@benchmark("exec_small")
+def bench_exec_small(iterations: int) -> dict:
+    """run_in_container round trip for a short command output."""
+    mcp_server = load_mcp_server()
+    fake_docker.exec_output = b"app.js\npackage.json\n"
+    fake_docker.frame_size = 1024
+    return summarize(measure(lambda: mcp_server.run_in_container("ls"), iterations))
+
+
+@benchmark("write_file")
+def bench_write_file(iterations: int) -> dict:
+    """write_file of a 20 KB source file, including the copy into the container."""
+    mcp_server = load_mcp_server()
+    content = "console.log('hello');\n" * 1000
+    samples = measure(lambda: mcp_server.write_file("src/app.js", content), iterations)
+    return summarize(samples, bytes_per_op=len(content))
+
+
+@benchmark("copy_to_container")
+def bench_copy_to_container(iterations: int) -> dict:
+    """copy_to_container of a 1 MB file."""
+    mcp_server = load_mcp_server()
+    workdir = mcp_server.sandbox_workdir(mcp_server.DEFAULT_SANDBOX)
+    os.makedirs(workdir, exist_ok=True)
+    path = os.path.join(workdir, "blob.bin")
+    with open(path, "wb") as f:
+        f.write(os.urandom(1_000_000))
+    samples = measure(lambda: mcp_server.copy_to_container(path), iterations)
+    return summarize(samples, bytes_per_op=1_000_000)
+
+
+@benchmark("setup_container")
+def bench_setup_container(iterations: int) -> dict:
+    """setup_container with a workspace of 200 leftover files to clean up."""
+    mcp_server = load_mcp_server()
+    workdir = mcp_server.sandbox_workdir(mcp_server.DEFAULT_SANDBOX)
+    os.makedirs(workdir, exist_ok=True)
+
+    def setup():
+        for i in range(200):
+            with open(os.path.join(workdir, f"leftover-{i}.js"), "w") as f:
+                f.write("x")
+        mcp_server.setup_container()
+
+    return summarize(measure(setup, iterations))
+
+
+@benchmark("agent_iteration")
+def bench_agent_iteration(iterations: int) -> dict:
+    """run_agent_iteration overhead: scripted Ollama reply plus one in-process tool call."""
+    import mcp_session
+    from adapters.ollama_adapter import OllamaAdapter
+    from agent_guard import AgentGuard
+    from engine import Reporter, run_agent_iteration
+    from fastmcp import Client, FastMCP
+
+    tools = FastMCP("bench-tools")
+
+    @tools.tool
+    def list_files() -> str:
+        """Lists all files in the workspace."""
+        return "app.js\npackage.json"
+
+    script = [{
+        "role": "assistant",
+        "content": "",
+        "tool_calls": [{"function": {"name": "list_files", "arguments": {}}}]
+    }]
+
+    async def run():
+        mcp_session.create_client = lambda transport: Client(tools)
+        async with mcp_session.MCPSessionPool(max_size=1) as pool, pool.session() as session:
+            tool_list = await session.list_tools()
+            model = OllamaAdapter(model_name="fake")
+            report = Reporter(lambda event: None)
+
+            async def iteration():
+                # A fresh conversation each time, so prompt growth doesn't skew the numbers
+                messages = [{"role": "system", "content": "You are a coding agent."},
+                            {"role": "user", "content": "Build the app."}]
+                await run_agent_iteration(model, messages, tool_list, session, AgentGuard(), report)
+
+            return await measure_async(iteration, iterations)
+
+    with FakeOllamaServer(script) as ollama_server:
+        os.environ["OLLAMA_HOST"] = ollama_server.url
+        samples = asyncio.run(run())
+    return summarize(samples)
+
+
+@benchmark("newman_report_parse")
+def bench_newman_report_parse(iterations: int) -> dict:
+    """
+    parse_newman_report on a synthetic report with 2000 executions. Streaming trades some
+    speed for memory, so its peak memory is measured too, next to json.load of the same report.
+    """
+    from newman_report import parse_newman_report
+
+    executions = [{
+        "item": {"name": f"Request {i}"},
+        "response": {"stream": {"type": "Buffer", "data": list(range(200))}},
+        "assertions": [
+            {"assertion": "Status code is 200"},
+            {"assertion": "Body matches", "error": {"message": "expected 'a' to equal 'b'"}}
+        ]
+    } for i in range(2000)]
+    report = {"run": {"stats": {"assertions": {"total": 4000, "failed": 2000}}, "executions": executions}}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "report.json"
+        path.write_text(json.dumps(report))
+        samples = measure(lambda: parse_newman_report(path), iterations)
+        size = path.stat().st_size
+        result = summarize(samples, bytes_per_op=size)
+        result["peak_mb"] = peak_memory_mb(lambda: parse_newman_report(path))
+        result["json_load_peak_mb"] = peak_memory_mb(lambda: json.loads(path.read_text()))
+    return result
+
+
+@benchmark("artifact_put")
+def bench_artifact_put(iterations: int) -> dict:
+    """Storing 1 MB of npm-style output in the artifact store (hash + gzip + index)."""
+    from artifact_store import ArtifactStore
+
+    line = "npm http fetch GET 200 https://registry.npmjs.org/express 12ms\n"
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ArtifactStore(Path(tmp))
+        counter = iter(range(10 ** 9))
+        # Vary the content so every put compresses and writes a new object
+        samples = measure(lambda: store.put_text(f"{next(counter)}\n" + line * 16000, "stdout.txt", "stdout"), iterations)
+    return summarize(samples, bytes_per_op=len(line) * 16000)
+
+
+@benchmark("wait_for_server")
+def bench_wait_for_server(iterations: int) -> dict:
+    """wait_for_server against a healthy dummy app."""
+    from utils import wait_for_server
+
+    with DummyApp() as app:
+        samples = measure(lambda: asyncio.run(wait_for_server(f"{app.url}/health")), iterations)
+    return summarize(samples)
+
+
+@benchmark("newman_run")
+def bench_newman_run(iterations: int) -> dict:
+    """A full newman run of the login-page collection against the dummy app (needs newman)."""
+    if not shutil.which("newman"):
+        return {"skipped": "newman not installed"}
+
+    test_file = SRC_DIR / "tasks" / "tests" / "login-page.json"
+    with DummyApp() as app, tempfile.TemporaryDirectory() as tmp:
+        cmd = ["newman", "run", str(test_file), "--env-var", f"BASE_URL={app.url}",
+               "--reporters", "json", "--reporter-json-export", str(Path(tmp) / "report.json")]
+        samples = measure(lambda: subprocess.run(cmd, capture_output=True), iterations, warmup=1)
+    return summarize(samples)
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or "p50_ms" not in result or "p50_ms" not in base:
+            continue
+        allowed = 1 + base.get("threshold", threshold)
+        result["baseline_p50_ms"] = base["p50_ms"]
+        result["change"] = f"{(result['p50_ms'] / base['p50_ms'] - 1) * 100:+.1f}%" if base["p50_ms"] else "n/a"
+        over_memory = "peak_mb" in result and "peak_mb" in base and result["peak_mb"] > base["peak_mb"] * allowed
+        if result["p50_ms"] > base["p50_ms"] * allowed or over_memory:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the harness against local fakes")
+    parser.add_argument("--only", nargs="*", choices=sorted(BENCHMARKS), help="Benchmarks to run")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed p50 slowdown over the baseline, as a fraction")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    # mcp_server reads tasks/ relative to the working directory
+    os.chdir(SRC_DIR)
+    sys.path.insert(0, str(SRC_DIR))
+    # Keep the log formatting cost the harness pays, without flooding the terminal
+    logging.basicConfig(level=logging.INFO, handlers=[logging.StreamHandler(open(os.devnull, "w"))], force=True)
+
+    results = {}
+    for name in args.only or BENCHMARKS:
+        results[name] = BENCHMARKS[name](args.iterations)
+        # mcp_server re-applies basicConfig on import, keep it pointed at devnull
+        logging.basicConfig(level=logging.INFO, handlers=[logging.StreamHandler(open(os.devnull, "w"))], force=True)
+        print(f"{name:22} {json.dumps(results[name])}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    baseline = json.loads(BASELINE_FILE.read_text()) if BASELINE_FILE.exists() else {}
+    if args.save_baseline:
+        for name, result in results.items():
+            if "p50_ms" in result:
+                baseline[name] = {**baseline.get(name, {}), "p50_ms": result["p50_ms"], "p95_ms": result["p95_ms"]}
+                if "peak_mb" in result:
+                    baseline[name]["peak_mb"] = result["peak_mb"]
+        BASELINE_FILE.write_text(json.dumps(baseline, indent=2) + "\n")
+        print(f"Baseline saved to {BASELINE_FILE}")
+        return
+
+    regressions = compare(results, baseline, args.threshold)
+    for name in results:
+        if "change" in results[name]:
+            marker = "REGRESSION" if name in regressions else "ok"
+            memory = f", peak {results[name]['peak_mb']} MB" if "peak_mb" in results[name] else ""
+            print(f"{name:22} p50 {results[name]['p50_ms']} ms vs {results[name]['baseline_p50_ms']} ms ({results[name]['change']}){memory} {marker}")
+    if regressions:
+        print(f"Regressed: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlparse
+import docker
+
+# Comma separated Docker endpoints, e.g. "unix:///var/run/docker.sock,tcp://dind1:2375".
+# Empty means the single engine docker.from_env() finds.
+DOCKER_HOSTS = [host.strip() for host in os.environ.get("DOCKER_HOSTS", "").split(",") if host.strip()]
+# Memory limit of a sandbox container, also what placement reserves for it
+SANDBOX_MEMORY_MB = int(os.environ.get("SANDBOX_MEMORY_MB", 2048))
+# Where the dashboard reaches a sandbox published on the local engine, {port} is the host port
+SANDBOX_BASE_URL = os.environ.get("SANDBOX_BASE_URL", "http://host.docker.internal:{port}")
+SANDBOX_LABEL = "benchmarker.sandbox"
+ENGINE_TIMEOUT = 10
+
+
+class Engine:
+    """
+    One Docker engine sandboxes can be placed on.
+
+    Args:
+        url (str): The engine's Docker endpoint, or None for docker.from_env().
+    """
+
+    def __init__(self, url: str = None):
+        self.url = url
+        parsed = urlparse(url or "")
+        # Engines reached over TCP publish sandbox ports on their own address
+        self.host = parsed.hostname if parsed.scheme in ("tcp", "http", "https") else None
+        self.name = self.host or "local"
+        # Sandboxes placed here whose container doesn't exist yet, so load() can't see them
+        self.placing = 0
+        self._client = None
+
+    @property
+    def client(self) -> docker.DockerClient:
+        # Connecting asks the engine for its API version, so an engine that is down
+        # only fails the calls that go to it
+        if self._client is None:
+            self._client = docker.DockerClient(base_url=self.url, timeout=ENGINE_TIMEOUT) if self.url else docker.from_env()
+        return self._client
+
+    @property
+    def local(self) -> bool:
+        return self.host is None
+
+    def base_url(self, port: int) -> str:
+        if self.local:
+            return SANDBOX_BASE_URL.format(port=port)
+        return f"http://{self.host}:{port}"
+
+    def load(self) -> dict:
+        """
+        Running containers and the memory left once every sandbox here gets its limit,
+        counting sandboxes still being placed here as running.
+        """
+        info = self.client.info()
+        sandboxes = len(self.client.containers.list(filters={"label": SANDBOX_LABEL})) + self.placing
+        return {
+            "engine": self.name,
+            "running": info["ContainersRunning"] + self.placing,
+            "sandboxes": sandboxes,
+            "free_memory_mb": info["MemTotal"] // 2 ** 20 - sandboxes * SANDBOX_MEMORY_MB
+        }
+
+
+class EnginePool:
+    """
+    The Docker engines from DOCKER_HOSTS and the placement of new sandboxes on them.
+
+    A new sandbox goes to the engine with the fewest running containers among those with
+    memory left for one more sandbox, preferring the one with the most free memory on a
+    tie. Engines that don't answer are skipped.
+
+    setup_container runs in worker threads, so placements happen concurrently. A placement
+    is counted on its engine from the moment it is chosen until its container exists, and
+    choosing is serialized, so tasks starting together spread out instead of all seeing
+    the same loads.
+    """
+
+    def __init__(self, urls: list = DOCKER_HOSTS):
+        self.engines = [Engine(url) for url in urls] or [Engine()]
+        self._lock = threading.Lock()
+
+    def _loads(self) -> list:
+        def probe(engine):
+            try:
+                return engine, engine.load()
+            except Exception as e:
+                logging.warning(f"Docker engine {engine.name} is unavailable: {e}")
+                return engine, None
+
+        with ThreadPoolExecutor(max_workers=len(self.engines)) as executor:
+            return [(engine, load) for engine, load in executor.map(probe, self.engines) if load is not None]
+
+    def place(self) -> Engine:
+        """Pick the engine for a new sandbox."""
+        if len(self.engines) == 1:
+            return self.engines[0]
+
+        loads = self._loads()
+        if not loads:
+            raise RuntimeError("No Docker engine is reachable")
+        with_room = [(engine, load) for engine, load in loads if load["free_memory_mb"] >= SANDBOX_MEMORY_MB]
+        if not with_room:
+            logging.warning(f"No Docker engine has {SANDBOX_MEMORY_MB} MB free, placing on the emptiest one")
+            with_room = loads
+
+        engine, load = min(with_room, key=lambda item: (item[1]["running"], -item[1]["free_memory_mb"]))
+        logging.info(f"Placing sandbox on {engine.name}: {load}")
+        return engine
+
+    @contextmanager
+    def placement(self):
+        """Pick the engine for a new sandbox, which must be created on it before the block ends."""
+        with self._lock:
+            engine = self.place()
+            engine.placing += 1
+        try:
+            yield engine
+        finally:
+            # Under the lock, so a placement never sees neither the reservation nor the container
+            with self._lock:
+                engine.placing -= 1
+
+    def locate(self, container_name: str) -> Engine:
+        """The engine running the named container, for sandboxes created before a restart."""
+        if len(self.engines) == 1:
+            return self.engines[0]
+
+        def has_container(engine):
+            try:
+                engine.client.containers.get(container_name)
+                return True
+            except docker.errors.NotFound:
+                return False
+            except Exception as e:
+                logging.warning(f"Docker engine {engine.name} is unavailable: {e}")
+                return False
+
+        # Asked in parallel, like the load probes, so a slow engine costs one timeout at most
+        with ThreadPoolExecutor(max_workers=len(self.engines)) as executor:
+            found = list(executor.map(has_container, self.engines))
+        return next((engine for engine, has in zip(self.engines, found) if has), self.engines[0])
@@ -0,0 +1,399 @@
+import asyncio
+import json
+import logging
+import subprocess
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from adapters.ollama_adapter import OllamaAdapter
+from agent_guard import AgentGuard, COMPLETED, task_budget
+from artifact_store import store
+from live_tests import LiveTester, sandbox_base_url
+from mcp_session import MCP_POOL_SIZE, MCPSessionPool, PooledSession
+from newman_report import parse_newman_report
+from scoreboard import save_run_to_scoreboard
+from task_registry import registry
+import tracing
+
+AGENT_TOOLS = ['list_files', 'read_file', 'write_file', 'exec', 'get_container_logs', 'read_output']
+# Phases of an Ollama call as (span name, duration field, token count field), in order
+LLM_PHASES = [
+    ("load", "load_duration", None),
+    ("prompt_eval", "prompt_eval_duration", "prompt_eval_count"),
+    ("generation", "eval_duration", "eval_count")
+]
+
+
+def log_event(event: dict):
+    """The default event handler: write the event's message to the log."""
+    if event.get("message"):
+        logging.log(logging.ERROR if event["level"] == "error" else logging.INFO, event["message"])
+
+
+class Reporter:
+    """
+    Sends progress events of a benchmark run to a callback.
+
+    Every event is a dict with the event name, a human readable message, a level (info,
+    success or error), the reporter's context such as run_id and task, and any extra
+    fields. Events reported from worker threads are handed to the event loop the
+    reporter was created in, so the callback always runs on that thread.
+
+    Args:
+        on_event: Called with each event dict, defaults to log_event.
+        **context: Fields added to every event.
+    """
+
+    def __init__(self, on_event=None, **context):
+        self.on_event = on_event or log_event
+        self.context = context
+        try:
+            self._loop = asyncio.get_running_loop()
+            self._thread = threading.get_ident()
+        except RuntimeError:
+            self._loop = None
+
+    def for_task(self, task_name: str) -> "Reporter":
+        return Reporter(self.on_event, **self.context, task=task_name)
+
+    def __call__(self, event: str, message: str = None, level: str = "info", **fields):
+        payload = {"event": event, **self.context, **fields, "message": message, "level": level}
+        if self._loop is not None and threading.get_ident() != self._thread:
+            self._loop.call_soon_threadsafe(self.on_event, payload)
+        else:
+            self.on_event(payload)
+
+
+async def execute_tool_calls(calls, messages, session: PooledSession, guard: AgentGuard, report: Reporter):
+    for call in calls:
+        report("tool_call", f"Calling tool: {call.function.name}", tool=call.function.name)
+        logging.info(f"Calling tool: {call.function.name} with arguments: {call.function.arguments}")
+        result = await session.call_tool_mcp(call.function.name, call.function.arguments)
+        logging.info(f"Result: {result}")
+        messages.append({'role': 'tool', 'content': result.content[0].text})
+
+        guard.record_tool(call.function.name, call.function.arguments, result.content[0].text)
+        if guard.stop_status:
+            break
+
+
+def trace_llm_phases(response, start_us: int, end_us: int):
+    """
+    Split an LLM span into the phases Ollama reports durations for, laid back to back up to
+    the span's end and clipped to its start, so they always nest inside it.
+    """
+    for name, duration_field, count_field in reversed(LLM_PHASES):
+        phase_start = max(end_us - (response.get(duration_field) or 0) // 1000, start_us)
+        if phase_start < end_us:
+            args = {"tokens": response.get(count_field)} if count_field else {}
+            tracing.record(name, "llm_phase", phase_start, end_us - phase_start, **args)
+            end_us = phase_start
+
+
+async def run_agent_iteration(model, messages, tools, session: PooledSession, guard: AgentGuard, report: Reporter, think=False):
+    # The Ollama client blocks, run it in a thread so concurrent tasks keep going
+    with tracing.span("llm", "llm", model=model.model_name) as span:
+        response = await asyncio.to_thread(
+            model.chat,
+            messages=messages,
+            tools=tools,
+            think=think,
+            options={
+                "seed": 2222,
+                "temperature": 0
+            }
+        )
+        span.args.update(prompt_tokens=response.get("prompt_eval_count"), completion_tokens=response.get("eval_count"))
+    if span.end_us is not None:
+        trace_llm_phases(response, span.start_us, span.end_us)
+
+    messages.append(response['message'])
+    guard.record_llm(response)
+
+    if response.message.tool_calls and not guard.stop_status:
+        await execute_tool_calls(response.message.tool_calls, messages, session, guard, report)
+
+    return messages
+
+
+async def run_agent_for_task(task_number: int, model_name: str, session: PooledSession, run_id: str = None,
+                             live_tests: bool = False, report: Reporter = None) -> dict:
+    """
+    Run the agent for a specific task. Returns the agent status, the reason it stopped, its usage
+    and the base URL of the sandbox's server.
+
+    With live_tests, the task's tests run in the background whenever the sandbox server is
+    up and the run ends as soon as they all pass. The passing result is then returned as
+    test_result so it doesn't have to be run again.
+    """
+    report = report or Reporter()
+    logging.info(f"Starting agent for task {task_number} with model {model_name}")
+    model = OllamaAdapter(model_name=model_name)
+
+    tools = await session.list_tools()
+    agent_tools = [tool for tool in tools if tool.name in AGENT_TOOLS]
+
+    task = await session.call_tool("get_task", {"task_number": task_number})
+    messages = json.loads(task.content[0].text)
+
+    task_entry = registry.get(task_number)
+    report("sandbox_setup", "Setting up sandbox container")
+    log = await session.call_tool("setup_container", {"port": task_entry["port"]})
+    sandbox = json.loads(log.content[0].text)
+    logging.info(f"Workspace initialized: {sandbox}")
+    report("sandbox_ready", f"Sandbox {sandbox['sandbox']} running on {sandbox['engine']}", **sandbox)
+
+    guard = AgentGuard(task_budget(task_entry))
+    live = None
+    if live_tests:
+        live = LiveTester(task_entry, lambda base_url: run_newman_tests(task_entry["name"], run_id, base_url, report),
+                          sandbox["base_url"])
+    done = False
+
+    while not done and guard.start_iteration():
+        report("iteration", f"Agent iteration {guard.iterations + 1}", iteration=guard.iterations + 1)
+
+        with tracing.span(f"iteration {guard.iterations + 1}", "iteration"):
+            messages = await run_agent_iteration(model, messages, agent_tools, session, guard, report, think=False)
+        last_message = messages[-1]
+
+        if live is not None:
+            digest = (await session.call_tool("workspace_digest")).content[0].text
+            if await live.poll(digest):
+                report("first_green", f"All tests pass after {guard.iterations} iterations ({live.time_to_first_green}s)",
+                       "success", time_to_first_green_s=live.time_to_first_green)
+                return {
+                    "status": COMPLETED,
+                    "reason": f"All tests passed after {guard.iterations} iterations",
+                    "usage": guard.usage(),
+                    "test_result": live.cache[digest],
+                    "time_to_first_green_s": live.time_to_first_green,
+                    "base_url": sandbox["base_url"]
+                }
+
+        if last_message['role'] == 'assistant' and not last_message.tool_calls:
+            logging.info(f"Final response: {last_message.content}")
+            report("final_iteration", "Ensuring server is running")
+            messages.append({'role': 'user', 'content': "run the server"})
+            # The extra turn is held to the same budget as the others
+            if guard.start_iteration():
+                with tracing.span("final iteration", "iteration"):
+                    await run_agent_iteration(model, messages, agent_tools, session, guard, report, think=False)
+            done = True
+
+    result = {"status": COMPLETED, "reason": None, "usage": guard.usage(), "base_url": sandbox["base_url"]}
+    # The guard may also have stopped the final turn, the agent finishing doesn't undo that
+    if guard.stop_status is not None:
+        logging.info(f"Agent stopped early ({guard.stop_status}): {guard.stop_reason}")
+        result.update(status=guard.stop_status, reason=guard.stop_reason)
+
+    if live is not None:
+        # A workspace that already passed is not tested again, anything else gets the final run
+        digest = (await session.call_tool("workspace_digest")).content[0].text
+        result["test_result"] = await live.finish(digest)
+        result["time_to_first_green_s"] = live.time_to_first_green
+        report("log", f"Live test runs: {live.test_runs}")
+
+    return result
+
+
+def run_newman_tests(task_name: str, run_id: str = None, base_url: str = None, report: Reporter = None) -> dict:
+    """Run Newman tests for a task and return results. base_url overrides the collection's BASE_URL."""
+    report = report or Reporter()
+    test_file = Path(registry.get_by_name(task_name)["test_file"])
+
+    if not test_file.exists():
+        report("log", f"Test file not found: {test_file}", "error")
+        return {
+            "task_name": task_name,
+            "status": "skipped",
+            "message": f"No test file found: {task_name}.json",
+            "tests": {"total": 0, "passed": 0, "failed": 0, "details": []}
+        }
+
+    # newman needs a path to export to, the report is moved into the store once parsed
+    result_file = store.scratch_path(suffix=".json")
+    cmd = [
+        "newman", "run", str(test_file),
+        "--reporters", "json,cli",
+        "--reporter-json-export", str(result_file)
+    ]
+    if base_url:
+        cmd += ["--env-var", f"BASE_URL={base_url}"]
+
+    report("log", f"Running: {' '.join(cmd)}")
+
+    try:
+        with tracing.span("newman", "tests", base_url=base_url):
+            process = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+
+        # Save stdout/stderr as artifacts
+        artifacts = {
+            "stdout": store.put_text(process.stdout or "", f"newman-{task_name}-stdout.txt", "stdout", run_id, task_name)["digest"],
+            "stderr": store.put_text(process.stderr or "", f"newman-{task_name}-stderr.txt", "stderr", run_id, task_name)["digest"]
+        }
+
+        report("log", f"Newman exit code: {process.returncode}")
+
+        if process.stderr:
+            report("log", f"Newman stderr: {process.stderr[:500]}", "error")
+
+        if result_file.stat().st_size > 0:
+            newman_report = parse_newman_report(result_file)
+            report("log", f"Newman stats: {json.dumps(newman_report['stats'])}")
+
+            artifacts["report"] = store.put_file(result_file, f"newman-{task_name}.json", "report", run_id, task_name)["digest"]
+            report("log", f"Artifacts saved to: {store.root} ({', '.join(f'{k}={v[:12]}' for k, v in artifacts.items())})")
+
+            return {
+                "task_name": task_name,
+                "status": "completed",
+                "artifacts": artifacts,
+                "tests": {
+                    "total": newman_report["total"],
+                    "passed": newman_report["passed"],
+                    "failed": newman_report["failed"],
+                    "details": newman_report["details"]
+                }
+            }
+        else:
+            report("log", f"Newman did not write a report", "error")
+            return {
+                "task_name": task_name,
+                "status": "error",
+                "message": f"Newman did not produce results. Exit code: {process.returncode}. stderr: {process.stderr}",
+                "artifacts": artifacts,
+                "tests": {"total": 0, "passed": 0, "failed": 0, "details": []}
+            }
+
+    except subprocess.TimeoutExpired:
+        report("log", "Newman timed out", "error")
+        return {
+            "task_name": task_name,
+            "status": "timeout",
+            "message": "Newman tests timed out after 120 seconds",
+            "tests": {"total": 0, "passed": 0, "failed": 0, "details": []}
+        }
+    except Exception as e:
+        report("log", f"Newman exception: {str(e)}", "error")
+        logging.exception(f"Newman failed for {task_name}")
+        return {
+            "task_name": task_name,
+            "status": "error",
+            "message": str(e),
+            "tests": {"total": 0, "passed": 0, "failed": 0, "details": []}
+        }
+    finally:
+        result_file.unlink(missing_ok=True)
+
+
+async def run_task(pool: MCPSessionPool, task_number: int, model_name: str, run_id: str,
+                   live_tests: bool, report: Reporter) -> dict:
+    """Agent, then tests, for one task. Returns the task's test result with the agent's outcome."""
+    task = registry.get(task_number)
+    task_name = task["name"]
+    # Each task gets its own sandbox, placed on whichever Docker engine is least loaded
+    sandbox = f"{run_id}-{task_name}"
+    report("task_started", f"Starting task: {task_name}", title=task["title"])
+
+    # Run agent
+    agent_result = {"reason": None, "usage": {}}
+    try:
+        async with pool.session(sandbox) as session:
+            agent_result = await run_agent_for_task(task_number, model_name, session, run_id, live_tests, report)
+        agent_status = agent_result["status"]
+        if agent_status == COMPLETED:
+            report("agent_finished", f"Agent completed: {agent_status}", "success", status=agent_status)
+        else:
+            report("agent_finished", f"Agent stopped early: {agent_status} ({agent_result['reason']})", "error",
+                   status=agent_status, reason=agent_result["reason"])
+    except Exception as e:
+        logging.exception(f"Agent failed for task {task_name}")
+        agent_status = "error"
+        report("agent_finished", f"Agent error: {str(e)}", "error", status=agent_status, reason=str(e))
+
+    # Run tests, unless the live tests already passed on the final workspace
+    test_result = agent_result.get("test_result")
+    if test_result is None:
+        report("tests_started", f"Running tests for {task_name}")
+        base_url = agent_result.get("base_url") or sandbox_base_url(task)
+        test_result = await asyncio.to_thread(run_newman_tests, task_name, run_id, base_url, report)
+    else:
+        report("log", f"Reusing passing live test results for {task_name}")
+
+    try:
+        async with pool.session(sandbox) as session:
+            tracer = tracing.current()
+            if tracer is not None:
+                # The MCP server's side of the task: tool handling and Docker API calls
+                spans = await session.call_tool("trace_spans")
+                tracer.add_remote(json.loads(spans.content[0].text), lane=task_name)
+            await session.call_tool("terminate_container")
+    except Exception:
+        logging.exception(f"Failed to remove sandbox {sandbox}")
+
+    test_result = {**test_result, "time_to_first_green_s": agent_result.get("time_to_first_green_s")}
+    test_result["agent_status"] = agent_status
+    test_result["agent_stop_reason"] = agent_result["reason"]
+    test_result["agent_usage"] = agent_result["usage"]
+
+    tests = test_result["tests"]
+    if tests["failed"] == 0 and tests["total"] > 0:
+        message, level = f"Tests passed: {tests['passed']}/{tests['total']}", "success"
+    else:
+        message, level = f"Tests: {tests['passed']}/{tests['total']} passed", "error"
+    report("task_finished", message, level, agent_status=agent_status,
+           passed=tests["passed"], failed=tests["failed"], total=tests["total"])
+    return test_result
+
+
+async def run_benchmark(task_ids: list, model_name: str, live_tests: bool = False, concurrency: int = 1,
+                        on_event=None) -> list:
+    """
+    Run the selected tasks, up to `concurrency` at once, and record the run on the scoreboard.
+    Progress is reported to on_event as event dicts (see Reporter). Returns the task results
+    in the order of task_ids.
+    """
+    tasks = registry.all()
+    task_ids = [task_id for task_id in task_ids if task_id < len(tasks)]
+    # Sandboxes are named after the run, runs started in the same second must not share them
+    run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    report = Reporter(on_event, run_id=run_id)
+    report("run_started", f"Running {len(task_ids)} tasks with {model_name}", model=model_name,
+           tasks=[tasks[task_id]["name"] for task_id in task_ids], concurrency=concurrency)
+
+    slots = asyncio.Semaphore(concurrency)
+
+    async def run_one(task_id):
+        task_name = tasks[task_id]["name"]
+        async with slots:
+            # Every task is its own row of the run's timeline
+            with tracing.lane(task_name), tracing.span(task_name, "task"):
+                return await run_task(pool, task_id, model_name, run_id, live_tests, report.for_task(task_name))
+
+    tracer = tracing.Tracer()
+    # One pool for the whole run, so consecutive tasks reuse the same MCP connections
+    with tracing.use(tracer), tracing.span(f"run {run_id}", "run", model=model_name):
+        async with MCPSessionPool(max_size=max(MCP_POOL_SIZE, concurrency)) as pool:
+            results = list(await asyncio.gather(*(run_one(task_id) for task_id in task_ids)))
+
+            mcp_latency = pool.latency.summary()
+            for transport, stats in mcp_latency.items():
+                report("mcp_latency", f"MCP latency ({transport}): {stats['calls']} calls, mean {stats['mean_ms']} ms, p95 {stats['p95_ms']} ms",
+                       transport=transport, **stats)
+
+    run_entry = None
+    if results:
+        trace = store.put_text(json.dumps(tracer.export()), f"trace-{run_id}.json", "trace", run_id)["digest"]
+        report("log", f"Trace saved as {trace[:12]}, open it in ui.perfetto.dev or chrome://tracing")
+        run_entry = save_run_to_scoreboard(model_name, results, mcp_latency, run_id, trace)
+    report("run_finished", "Results saved to scoreboard" if run_entry else "No results to save",
+           "success" if run_entry else "info", summary=run_entry["summary"] if run_entry else None)
+
+    store.migrate_legacy()
+    retention = store.enforce_retention()
+    if retention["removed_objects"]:
+        report("log", f"Artifact retention freed {retention['freed_bytes'] / 1e6:.1f} MB ({retention['removed_objects']} objects)")
+
+    return results
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import os
+import time
+from docker_engines import SANDBOX_BASE_URL
+import tracing
+from utils import server_ready
+
+# Whether the dashboard runs tests while the agent works, unless toggled in the UI
+LIVE_TESTS = os.environ.get("LIVE_TESTS", "0") == "1"
+
+
+def sandbox_base_url(task: dict) -> str:
+    """Where a task's server is reached on the local engine, when setup_container didn't say."""
+    return SANDBOX_BASE_URL.format(port=task["port"])
+
+
+def all_passed(result: dict) -> bool:
+    return result["tests"]["total"] > 0 and result["tests"]["failed"] == 0
+
+
+class LiveTester:
+    """
+    Runs a task's test collection in the background while the agent is still working.
+
+    After each agent iteration the loop calls `poll` with the current workspace digest.
+    When the sandbox server answers on the task's readiness path and that workspace has
+    not been tested yet, newman is started in a worker thread; the LLM call is blocking,
+    so the thread keeps going while the model generates. Results are cached per workspace
+    digest, so an unchanged workspace is never tested twice.
+
+    Args:
+        task (dict): The task entry from the registry.
+        run_tests: Called as run_tests(base_url) in a worker thread, returns a test result dict.
+        base_url (str): Where the sandbox serves the task, as returned by setup_container.
+    """
+
+    def __init__(self, task: dict, run_tests, base_url: str = None):
+        self.task = task
+        self.run_tests = run_tests
+        self.base_url = base_url or sandbox_base_url(task)
+        self.readiness_url = f"{self.base_url}{task['readiness_path']}"
+        self.cache = {}
+        self.pending = None
+        self.test_runs = 0
+        self.start = time.monotonic()
+        self.time_to_first_green = None
+
+    def _collect(self):
+        if self.pending is None or not self.pending[1].done():
+            return
+
+        digest, future = self.pending
+        self.pending = None
+        try:
+            result = future.result()
+        except Exception:
+            logging.exception(f"Live test run failed for {self.task['name']}")
+            return
+
+        # Only real runs are cached, a timeout or crash says nothing about the workspace
+        if result["status"] == "completed":
+            self.cache[digest] = result
+        if all_passed(result) and self.time_to_first_green is None:
+            self.time_to_first_green = round(time.monotonic() - self.start, 1)
+            logging.info(f"{self.task['name']} first green after {self.time_to_first_green}s")
+
+    async def poll(self, digest: str) -> dict:
+        """Start a test run if useful. Returns the cached result once this workspace passes everything."""
+        self._collect()
+
+        if digest in self.cache:
+            return self.cache[digest] if all_passed(self.cache[digest]) else None
+        if self.pending is not None:
+            # One run at a time, this workspace is picked up on a later poll
+            return None
+        if not await asyncio.to_thread(server_ready, self.readiness_url, 1):
+            return None
+
+        logging.info(f"Sandbox is up, testing workspace {digest[:12]} in the background")
+        self.test_runs += 1
+        # A task rather than a bare executor future, so the run's trace context follows the thread
+        with tracing.lane(f"{self.task['name']} live tests"):
+            self.pending = (digest, asyncio.create_task(asyncio.to_thread(self.run_tests, self.base_url)))
+        return None
+
+    async def finish(self, digest: str) -> dict:
+        """Wait for the run in flight, then return the cached result for this workspace if it passed."""
+        if self.pending is not None:
+            await asyncio.wait([self.pending[1]])
+        self._collect()
+        result = self.cache.get(digest)
+        return result if result is not None and all_passed(result) else None
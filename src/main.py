@@ -1,23 +1,21 @@
 import streamlit as st
-from fastmcp import Client
+import altair as alt
 import asyncio
 import json
 import logging
-import subprocess
-import os
-from pathlib import Path
 from datetime import datetime
-from adapters.ollama_adapter import OllamaAdapter
+from artifact_store import store
+from engine import run_benchmark
+from live_tests import LIVE_TESTS
+from scoreboard import clear_scoreboard, load_scoreboard
+from task_registry import registry
+from tracing import critical_path, row_order, timeline_rows
 
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s [%(levelname)s] %(message)s'
 )
 
-# MCP client
-MCP_SERVER_URL = os.environ.get("MCP_SERVER_URL", "http://mcp_server:8000/sse")
-SCOREBOARD_FILE = Path(__file__).parent / "results" / "scoreboard.json"
-
 st.set_page_config(page_title="Agent Benchmarker", page_icon="🧪", layout="wide")
 
 # Initialize session state
@@ -33,295 +31,45 @@ if "selected_model" not in st.session_state:
     st.session_state.selected_model = "qwen3"
 
 
-def load_manifest():
-    manifest_path = Path(__file__).parent / "tasks" / "manifest.json"
-    with open(manifest_path) as f:
-        return json.load(f)
-
-
-def load_scoreboard():
-    """Load scoreboard from file."""
-    if SCOREBOARD_FILE.exists():
-        with open(SCOREBOARD_FILE) as f:
-            return json.load(f)
-    return {"runs": []}
-
-
-def save_scoreboard(scoreboard):
-    """Save scoreboard to file."""
-    SCOREBOARD_FILE.parent.mkdir(exist_ok=True)
-    with open(SCOREBOARD_FILE, 'w') as f:
-        json.dump(scoreboard, f, indent=2)
-
-
-def save_run_to_scoreboard(model_name: str, results: list):
-    """Save a benchmark run to the scoreboard."""
-    scoreboard = load_scoreboard()
-
-    total_tests = sum(r["tests"]["total"] for r in results)
-    total_passed = sum(r["tests"]["passed"] for r in results)
-    total_failed = sum(r["tests"]["failed"] for r in results)
-
-    run_entry = {
-        "id": datetime.now().strftime("%Y%m%d_%H%M%S"),
-        "timestamp": datetime.now().isoformat(),
-        "model": model_name,
-        "summary": {
-            "tasks_run": len(results),
-            "total_tests": total_tests,
-            "passed": total_passed,
-            "failed": total_failed,
-            "pass_rate": round((total_passed / total_tests * 100), 1) if total_tests > 0 else 0
-        },
-        "task_results": [
-            {
-                "task_name": r["task_name"],
-                "agent_status": r.get("agent_status", "unknown"),
-                "tests_passed": r["tests"]["passed"],
-                "tests_failed": r["tests"]["failed"],
-                "tests_total": r["tests"]["total"]
-            }
-            for r in results
-        ]
-    }
-
-    scoreboard["runs"].append(run_entry)
-    save_scoreboard(scoreboard)
-    return run_entry
+# Engine events shown as a status line while the task runs
+STATUS_ICONS = {
+    "sandbox_setup": "📦",
+    "iteration": "🔄",
+    "tool_call": "🔧",
+    "first_green": "✅",
+    "final_iteration": "🚀",
+    "tests_started": "🧪",
+}
 
 
 def add_log(message, level="info"):
     st.session_state.logs.append({"message": message, "level": level})
 
 
-async def execute_tool_calls(calls, messages, mcp_instance: Client, status_container):
-    for call in calls:
-        status_container.write(f"🔧 Calling: `{call.function.name}`")
-        add_log(f"Calling tool: {call.function.name}")
-        logging.info(f"Calling tool: {call.function.name} with arguments: {call.function.arguments}")
-        result = await mcp_instance.call_tool_mcp(call.function.name, call.function.arguments)
-        logging.info(f"Result: {result}")
-        messages.append({'role': 'tool', 'content': result.content[0].text})
-
-
-async def run_agent_iteration(model, messages, tools, mcp_instance, status_container, think=False):
-    response = model.chat(
-        messages=messages,
-        tools=tools,
-        think=think,
-        options={
-            "seed": 2222,
-            "temperature": 0
-        }
-    )
+def dashboard_events(progress_bar, status_container, total: int):
+    """An engine event handler that drives the progress bar, the status area and the execution logs."""
+    finished = []
 
-    messages.append(response['message'])
+    def on_event(event):
+        name = event["event"]
+        if name == "task_started":
+            st.session_state.current_task = event["task"]
+            progress_bar.progress(len(finished) / total, text=f"Running: {event['title']}")
+            status_container.subheader(f"Task: {event['task']}")
+        elif name in STATUS_ICONS:
+            status_container.write(f"{STATUS_ICONS[name]} {event['message']}")
+        elif name == "agent_finished" and event["status"] == "error":
+            status_container.error(event["message"])
+        elif name == "agent_finished" and event["level"] == "error":
+            status_container.warning(f"Agent stopped early: {event['reason']}")
+        elif name == "task_finished":
+            finished.append(event["task"])
+            progress_bar.progress(len(finished) / total, text=f"{len(finished)}/{total} tasks done")
 
-    if response.message.tool_calls:
-        await execute_tool_calls(response.message.tool_calls, messages, mcp_instance, status_container)
-
-    return messages
+        if event["message"]:
+            add_log(event["message"], event["level"])
 
-
-async def run_agent_for_task(task_number: int, model_name: str, status_container):
-    """Run the agent for a specific task."""
-    logging.info(f"Starting agent for task {task_number} with model {model_name}")
-    model = OllamaAdapter(model_name=model_name)
-    fastmcp = Client(MCP_SERVER_URL)
-
-    async with fastmcp:
-        tools = await fastmcp.list_tools()
-        agent_tools = [tool for tool in tools if tool.name in ['list_files', 'read_file', 'write_file', 'exec', 'get_container_logs']]
-
-        task = await fastmcp.call_tool("get_task", {"task_number": task_number})
-        messages = json.loads(task.content[0].text)
-
-        status_container.write("📦 Setting up sandbox container...")
-        add_log("Setting up sandbox container")
-        log = await fastmcp.call_tool("setup_container")
-        logging.info(f"Workspace initialized: {log.content[0].text}")
-
-        iteration = 0
-        max_iterations = 50
-        done = False
-
-        while not done and iteration < max_iterations:
-            iteration += 1
-            status_container.write(f"🔄 Agent iteration {iteration}...")
-            add_log(f"Agent iteration {iteration}")
-
-            messages = await run_agent_iteration(model, messages, agent_tools, fastmcp, status_container, think=False)
-            last_message = messages[-1]
-
-            if last_message['role'] == 'assistant' and not last_message.tool_calls:
-                logging.info(f"Final response: {last_message.content}")
-                status_container.write("🚀 Ensuring server is running...")
-                add_log("Ensuring server is running")
-                messages.append({'role': 'user', 'content': "run the server"})
-                await run_agent_iteration(model, messages, agent_tools, fastmcp, status_container, think=False)
-                done = True
-
-        return done
-
-
-def run_newman_tests(task_name: str) -> dict:
-    """Run Newman tests for a task and return results."""
-    test_file = Path(__file__).parent / "tasks" / "tests" / f"{task_name}.json"
-
-    # Create artifacts directory for logs
-    artifacts_dir = Path(__file__).parent / "artifacts"
-    artifacts_dir.mkdir(exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-
-    if not test_file.exists():
-        add_log(f"Test file not found: {test_file}", "error")
-        return {
-            "task_name": task_name,
-            "status": "skipped",
-            "message": f"No test file found: {task_name}.json",
-            "tests": {"total": 0, "passed": 0, "failed": 0, "details": []}
-        }
-
-    result_file = artifacts_dir / f"newman-{task_name}-{timestamp}.json"
-    cmd = [
-        "newman", "run", str(test_file),
-        "--reporters", "json,cli",
-        "--reporter-json-export", str(result_file)
-    ]
-
-    add_log(f"Running: {' '.join(cmd)}", "info")
-
-    try:
-        process = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
-
-        # Save stdout/stderr as artifacts
-        stdout_file = artifacts_dir / f"newman-{task_name}-{timestamp}-stdout.txt"
-        stderr_file = artifacts_dir / f"newman-{task_name}-{timestamp}-stderr.txt"
-        with open(stdout_file, 'w') as f:
-            f.write(process.stdout or "")
-        with open(stderr_file, 'w') as f:
-            f.write(process.stderr or "")
-
-        add_log(f"Newman exit code: {process.returncode}", "info")
-        add_log(f"Artifacts saved to: {artifacts_dir}", "info")
-
-        if process.stderr:
-            add_log(f"Newman stderr: {process.stderr[:500]}", "error")
-
-        if result_file.exists():
-            with open(result_file) as f:
-                newman_result = json.load(f)
-
-            run_stats = newman_result.get("run", {}).get("stats", {})
-            assertions = run_stats.get("assertions", {})
-
-            add_log(f"Newman stats: {json.dumps(run_stats)}", "info")
-
-            total = assertions.get("total", 0)
-            failed = assertions.get("failed", 0)
-            passed = total - failed
-
-            details = []
-            executions = newman_result.get("run", {}).get("executions", [])
-            for execution in executions:
-                item_name = execution.get("item", {}).get("name", "Unknown")
-                assertions_list = execution.get("assertions", [])
-                for assertion in assertions_list:
-                    details.append({
-                        "name": f"{item_name}: {assertion.get('assertion', 'test')}",
-                        "passed": assertion.get("error") is None,
-                        "error": assertion.get("error", {}).get("message") if assertion.get("error") else None
-                    })
-
-            return {
-                "task_name": task_name,
-                "status": "completed",
-                "artifact_path": str(result_file),
-                "tests": {
-                    "total": total,
-                    "passed": passed,
-                    "failed": failed,
-                    "details": details
-                }
-            }
-        else:
-            add_log(f"Result file not found: {result_file}", "error")
-            return {
-                "task_name": task_name,
-                "status": "error",
-                "message": f"Newman did not produce results. Exit code: {process.returncode}. stderr: {process.stderr}",
-                "tests": {"total": 0, "passed": 0, "failed": 0, "details": []}
-            }
-
-    except subprocess.TimeoutExpired:
-        add_log("Newman timed out", "error")
-        return {
-            "task_name": task_name,
-            "status": "timeout",
-            "message": "Newman tests timed out after 120 seconds",
-            "tests": {"total": 0, "passed": 0, "failed": 0, "details": []}
-        }
-    except Exception as e:
-        add_log(f"Newman exception: {str(e)}", "error")
-        logging.exception(f"Newman failed for {task_name}")
-        return {
-            "task_name": task_name,
-            "status": "error",
-            "message": str(e),
-            "tests": {"total": 0, "passed": 0, "failed": 0, "details": []}
-        }
-
-
-async def run_benchmark(task_ids: list, model_name: str, progress_bar, status_container):
-    """Run benchmark for selected tasks."""
-    manifest = load_manifest()
-    st.session_state.results = []
-    st.session_state.logs = []
-
-    for i, task_id in enumerate(task_ids):
-        if task_id >= len(manifest["tasks"]):
-            continue
-
-        task = manifest["tasks"][task_id]
-        task_name = task["name"]
-        st.session_state.current_task = task_name
-
-        progress_bar.progress((i) / len(task_ids), text=f"Running: {task['title']}")
-        status_container.subheader(f"Task: {task_name}")
-        add_log(f"Starting task: {task_name}", "info")
-
-        # Run agent
-        try:
-            agent_success = await run_agent_for_task(task_id, model_name, status_container)
-            agent_status = "completed" if agent_success else "failed"
-            add_log(f"Agent completed: {agent_status}", "success" if agent_success else "error")
-        except Exception as e:
-            logging.exception(f"Agent failed for task {task_name}")
-            agent_status = "error"
-            add_log(f"Agent error: {str(e)}", "error")
-            status_container.error(f"Agent error: {str(e)}")
-
-        # Run tests
-        status_container.write("🧪 Running Newman tests...")
-        add_log(f"Running tests for {task_name}")
-        test_result = run_newman_tests(task_name)
-        test_result["agent_status"] = agent_status
-        st.session_state.results.append(test_result)
-
-        if test_result["tests"]["failed"] == 0 and test_result["tests"]["total"] > 0:
-            add_log(f"Tests passed: {test_result['tests']['passed']}/{test_result['tests']['total']}", "success")
-        else:
-            add_log(f"Tests: {test_result['tests']['passed']}/{test_result['tests']['total']} passed", "error")
-
-    progress_bar.progress(1.0, text="Complete!")
-
-    # Save to scoreboard
-    if st.session_state.results:
-        save_run_to_scoreboard(model_name, st.session_state.results)
-        add_log(f"Results saved to scoreboard", "success")
-
-    st.session_state.running = False
-    st.session_state.current_task = None
+    return on_event
 
 
 # UI - Tabs
@@ -337,10 +85,11 @@ with tab_benchmark:
         model_name = st.text_input("Model Name", value=st.session_state.selected_model,
                                    help="Enter the Ollama model name to use")
         st.session_state.selected_model = model_name
+        live_tests = st.checkbox("Test while the agent works", value=LIVE_TESTS,
+                                 help="Run the task's tests whenever the sandbox server is up and stop the agent as soon as they all pass")
 
     # Load tasks
-    manifest = load_manifest()
-    tasks = manifest["tasks"]
+    tasks = registry.all()
 
     # Task selection
     st.subheader("Tasks")
@@ -349,7 +98,8 @@ with tab_benchmark:
     with col1:
         selected_tasks = []
         for idx, task in enumerate(tasks):
-            if st.checkbox(f"**{task['name']}** - {task['title']}", value=True, key=f"task_{idx}"):
+            if st.checkbox(f"**{task['name']}** - {task['title']}", value=True, key=f"task_{idx}",
+                           help=f"{task['framework']} ({task['runtime']}) on port {task['port']}, ~{task['tokens']['total']} prompt tokens"):
                 selected_tasks.append(idx)
 
     with col2:
@@ -375,7 +125,11 @@ with tab_benchmark:
             progress_bar = st.progress(0, text="Starting...")
             status_container = st.container()
 
-            asyncio.run(run_benchmark(task_ids, model_name, progress_bar, status_container))
+            on_event = dashboard_events(progress_bar, status_container, len(task_ids))
+            st.session_state.results = asyncio.run(run_benchmark(task_ids, model_name, live_tests, on_event=on_event))
+            progress_bar.progress(1.0, text="Complete!")
+            st.session_state.running = False
+            st.session_state.current_task = None
             st.rerun()
 
     # Results section
@@ -398,6 +152,10 @@ with tab_benchmark:
         # Results table
         for result in st.session_state.results:
             with st.expander(f"**{result['task_name']}** - Agent: {result['agent_status']} | Tests: {result['tests']['passed']}/{result['tests']['total']}"):
+                if result.get("agent_stop_reason"):
+                    st.warning(f"Agent stopped early: {result['agent_stop_reason']}")
+                if result.get("time_to_first_green_s") is not None:
+                    st.caption(f"First green after {result['time_to_first_green_s']}s")
                 if result["status"] == "skipped":
                     st.info(result.get("message", "No tests available"))
                 elif result["status"] == "error":
@@ -442,7 +200,7 @@ with tab_scoreboard:
         with col_clear:
             st.write("")
             if st.button("🗑️ Clear Scoreboard", type="secondary"):
-                save_scoreboard({"runs": []})
+                clear_scoreboard()
                 st.rerun()
 
         # Filter runs
@@ -459,12 +217,16 @@ with tab_scoreboard:
                     "runs": 0,
                     "total_tests": 0,
                     "passed": 0,
-                    "failed": 0
+                    "failed": 0,
+                    "looped": 0,
+                    "budget_exceeded": 0
                 }
             model_stats[model]["runs"] += 1
             model_stats[model]["total_tests"] += run["summary"]["total_tests"]
             model_stats[model]["passed"] += run["summary"]["passed"]
             model_stats[model]["failed"] += run["summary"]["failed"]
+            model_stats[model]["looped"] += run["summary"].get("looped", 0)
+            model_stats[model]["budget_exceeded"] += run["summary"].get("budget_exceeded", 0)
 
         # Display model comparison table
         if model_stats:
@@ -477,7 +239,9 @@ with tab_scoreboard:
                     "Total Tests": stats["total_tests"],
                     "Passed": stats["passed"],
                     "Failed": stats["failed"],
-                    "Pass Rate": f"{pass_rate:.1f}%"
+                    "Pass Rate": f"{pass_rate:.1f}%",
+                    "Looped": stats["looped"],
+                    "Over Budget": stats["budget_exceeded"]
                 })
 
             st.dataframe(comparison_data, use_container_width=True, hide_index=True)
@@ -505,7 +269,34 @@ with tab_scoreboard:
                 col3.metric("Failed", summary["failed"])
                 col4.metric("Pass Rate", f"{pass_rate}%")
 
+                for transport, stats in run.get("mcp_latency", {}).items():
+                    st.caption(f"MCP {transport}: {stats['calls']} calls, mean {stats['mean_ms']} ms, p50 {stats['p50_ms']} ms, p95 {stats['p95_ms']} ms")
+
                 st.write("**Task Results:**")
                 for task in run["task_results"]:
                     status_icon = "✅" if task["tests_failed"] == 0 and task["tests_total"] > 0 else "❌"
                     st.write(f"- {status_icon} **{task['task_name']}**: {task['tests_passed']}/{task['tests_total']} tests (Agent: {task['agent_status']})")
+                    if task.get("agent_stop_reason"):
+                        st.caption(f"  Stopped early: {task['agent_stop_reason']}")
+                    if task.get("time_to_first_green_s") is not None:
+                        st.caption(f"  First green after {task['time_to_first_green_s']}s")
+
+                # Older runs have no trace, and retention may have removed it
+                if run.get("trace") and store.object_path(run["trace"]).exists():
+                    if st.checkbox("Show timeline", key=f"timeline_{run['id']}"):
+                        trace_json = store.read_text(run["trace"])
+                        rows = timeline_rows(json.loads(trace_json))
+
+                        chart = alt.Chart(alt.Data(values=rows)).mark_bar().encode(
+                            x=alt.X("start_s:Q", title="Seconds"),
+                            x2="end_s:Q",
+                            y=alt.Y("row:N", sort=row_order(rows), title=None),
+                            color=alt.Color("category:N", title="Span"),
+                            tooltip=["name:N", "category:N", "process:N", "start_s:Q", "duration_s:Q"]
+                        )
+                        st.altair_chart(chart, use_container_width=True)
+
+                        st.write("**Critical path per task (seconds):**")
+                        st.dataframe(critical_path(rows), use_container_width=True, hide_index=True)
+                        st.download_button("⬇️ Download trace", trace_json, f"trace-{run['id']}.json", "application/json",
+                                           key=f"trace_{run['id']}", help="Opens in ui.perfetto.dev or chrome://tracing")
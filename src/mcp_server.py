@@ -1,41 +1,96 @@
 import os
+import re
 import docker
 from fastmcp import FastMCP
-from fastmcp.prompts.prompt import Message
 import logging
 import json
 import select
+import shutil
 import time
+import uuid
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from docker_engines import SANDBOX_LABEL, SANDBOX_MEMORY_MB, Engine, EnginePool
+from metrics import ToolMetricsMiddleware, log_payload, metrics
+from output_compaction import compact_output, read_output_page
+from task_registry import registry
+from tracing import TracingMiddleware
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 WORKDIR = os.path.abspath("sandbox")
 CONTAINER_NAME = "sandbox_container"
+# The sandbox used when a client doesn't name one, e.g. agent.py
+DEFAULT_SANDBOX = "default"
+# Hashes every file's path and content under the working directory, skipping installed dependencies
+WORKSPACE_DIGEST_CMD = (
+    "find . \\( -name node_modules -o -name .git -o -name __pycache__ -o -name .venv \\) -prune "
+    "-o -type f -print0 | sort -z | xargs -0 -r sha256sum | sha256sum"
+)
+SANDBOX_ID = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]*")
 
 mcp = FastMCP("code-agent-tools")
-docker_client = docker.from_env()
+mcp.add_middleware(ToolMetricsMiddleware(metrics))
+tracing_middleware = TracingMiddleware()
+mcp.add_middleware(tracing_middleware)
+engines = EnginePool()
+# Sandbox id -> the engine its container was placed on
+sandbox_engines = {}
 
-global sandbox_container
 
+def container_name(sandbox: str) -> str:
+    if not SANDBOX_ID.fullmatch(sandbox):
+        raise ValueError(f"Invalid sandbox id: {sandbox}")
+    return CONTAINER_NAME if sandbox == DEFAULT_SANDBOX else f"{CONTAINER_NAME}_{sandbox}"
 
-with open("./tasks/manifest.json", "r", encoding="utf-8") as file:
 
-    tasks = json.load(file)['tasks']
+def sandbox_workdir(sandbox: str) -> str:
+    """The host folder holding a sandbox's workspace."""
+    container_name(sandbox)
+    return os.path.join(WORKDIR, sandbox)
 
-def run_in_container(cmd: str, timeout: int = 15):
 
-    container = docker_client.containers.get(CONTAINER_NAME)
+def sandbox_engine(sandbox: str) -> Engine:
+    if sandbox not in sandbox_engines:
+        # Created before a server restart, find it by its container name
+        sandbox_engines[sandbox] = engines.locate(container_name(sandbox))
+    return sandbox_engines[sandbox]
+
+
+def get_sandbox_container(sandbox: str):
+    with metrics.docker_call("containers.get"):
+        return sandbox_engine(sandbox).client.containers.get(container_name(sandbox))
+
+
+def remove_sandbox_container(engine: Engine, name: str):
+    try:
+        with metrics.docker_call("containers.get"):
+            existing_container = engine.client.containers.get(name)
+        logging.info(f"Removing existing container: {name}")
+        # force=True sends SIGKILL and removes the container in one go
+        with metrics.docker_call("remove"):
+            existing_container.remove(force=True)
+    except docker.errors.NotFound:
+        logging.info("No existing container to remove.")
+
+
+def run_in_container(cmd: str, timeout: int = 15, sandbox: str = DEFAULT_SANDBOX):
+
+    container = get_sandbox_container(sandbox)
+    docker_client = sandbox_engine(sandbox).client
     logging.info(f"Command: {cmd}")
 
-    exec_id = docker_client.api.exec_create(
-        container.id,
-        f"sh -c '{cmd} 2>&1 | tee /proc/1/fd/1'",
-        workdir="/app"
-    )['Id']
+    with metrics.docker_call("exec_create"):
+        exec_id = docker_client.api.exec_create(
+            container.id,
+            f"sh -c '{cmd} 2>&1 | tee /proc/1/fd/1'",
+            workdir="/app"
+        )['Id']
 
     # Proper logging approach
-    sock = docker_client.api.exec_start(exec_id, socket=True)
+    with metrics.docker_call("exec_start"):
+        sock = docker_client.api.exec_start(exec_id, socket=True)
     sock._sock.settimeout(0.1)  # Set socket timeout for non-blocking behavior
 
     output_chunks = []
@@ -43,51 +98,52 @@ def run_in_container(cmd: str, timeout: int = 15):
     buffer = b''
 
     try:
-        while True:
-            elapsed = time.time() - start_time
-
-            if elapsed >= timeout:
-                output = b''.join(output_chunks).decode('utf-8', errors='replace')
-                output += "\n\n[The Process continues running in background...]"
-                logging.info(output)
-                return output
-
-            try:
-                chunk = sock._sock.recv(4096)
-                if not chunk:
-                    # No more data, process has finished
-                    break
-
-                buffer += chunk
-
-                # Parse Docker stream multiplexing format
-                # Each frame: [stream_type(1)][padding(3)][size(4)][payload(size)]
-                while len(buffer) >= 8:
-                    header = buffer[:8]
-                    stream_type = header[0]
-                    payload_size = int.from_bytes(header[4:8], byteorder='big')
-
-                    if len(buffer) < 8 + payload_size:
-                        # Not enough data yet, wait for more
+        with metrics.docker_call("exec_stream"):
+            while True:
+                elapsed = time.time() - start_time
+
+                if elapsed >= timeout:
+                    output = b''.join(output_chunks).decode('utf-8', errors='replace')
+                    output += "\n\n[The Process continues running in background...]"
+                    log_payload("Output", output)
+                    return output
+
+                try:
+                    chunk = sock._sock.recv(4096)
+                    if not chunk:
+                        # No more data, process has finished
                         break
 
-                    payload = buffer[8:8 + payload_size]
-                    output_chunks.append(payload)
-                    buffer = buffer[8 + payload_size:]
+                    buffer += chunk
+
+                    # Parse Docker stream multiplexing format
+                    # Each frame: [stream_type(1)][padding(3)][size(4)][payload(size)]
+                    while len(buffer) >= 8:
+                        header = buffer[:8]
+                        stream_type = header[0]
+                        payload_size = int.from_bytes(header[4:8], byteorder='big')
 
-            except Exception:
-                # Socket timeout, continue to check elapsed time
-                continue
+                        if len(buffer) < 8 + payload_size:
+                            # Not enough data yet, wait for more
+                            break
+
+                        payload = buffer[8:8 + payload_size]
+                        output_chunks.append(payload)
+                        buffer = buffer[8 + payload_size:]
+
+                except Exception:
+                    # Socket timeout, continue to check elapsed time
+                    continue
     finally:
         sock.close()
 
     output = b''.join(output_chunks).decode('utf-8', errors='replace')
-    logging.info(output)
+    log_payload("Output", output)
     return output
 
-def copy_to_container(src_path: str, dest_path: str = "/app"):
+def copy_to_container(src_path: str, dest_path: str = "/app", sandbox: str = DEFAULT_SANDBOX):
     """Copy files from host to container."""
-    container = docker_client.containers.get(CONTAINER_NAME)
+    container = get_sandbox_container(sandbox)
 
     import tarfile
     import io
@@ -99,112 +155,125 @@ def copy_to_container(src_path: str, dest_path: str = "/app"):
     tar_stream.seek(0)
 
     # Put the archive in the container
-    container.put_archive(dest_path, tar_stream)
+    with metrics.docker_call("put_archive"):
+        container.put_archive(dest_path, tar_stream)
     return True
 
-def get_system_prompt() -> str:
-    with open(f"./tasks/prompts/system-prompt.md", "r", encoding="utf-8") as file:
-        return file.read()
-
 @mcp.tool()
 def get_task(task_number: int) -> list:
-
-    task = tasks[task_number]
-    prompt_path = f"{os.path.abspath(f"tasks/prompts/{task['name']}.md")}"
-    with open(prompt_path, "r", encoding="utf-8") as file:
-        prompt = file.read()
-
-    return [
-    {'role':'system', 'content':get_system_prompt()},
-    {'role': 'user', 'content':prompt},
-    ]
+    return registry.messages(task_number)
 
 @mcp.tool
-def setup_container():
-    global sandbox_container
+def setup_container(sandbox: str = DEFAULT_SANDBOX, port: int = 5000) -> dict:
+    """
+    Start a fresh sandbox container on the least loaded Docker engine and empty its workspace.
 
-    try:
-        existing_container = docker_client.containers.get(CONTAINER_NAME)
-        logging.info(f"Removing existing container: {CONTAINER_NAME}")
-        # force=True sends SIGKILL and removes the container in one go
-        existing_container.remove(force=True)
-    except docker.errors.NotFound:
-        logging.info("No existing container to remove.")
+    Args:
+        sandbox (str): The sandbox id, one per concurrently running task.
+        port (int): The port the task's server listens on inside the container.
 
-    sandbox_container = docker_client.containers.run(
-        "nikolaik/python-nodejs:python3.11-nodejs22-slim",
-        name=CONTAINER_NAME,
-        working_dir="/app",
-        command="tail -f /dev/null", # To keep running when tty = False
-        ports={'5000/tcp': 5000},
-        detach=True,
-        stdout=True,
-        network=f"benchmarker_default",
-        labels={
-            "com.docker.compose.project": "benchmarker",
-            "com.docker.compose.service": "sandbox",
-        }
-    )
-    logging.info(f"Started fresh container: {CONTAINER_NAME}")
+    Returns:
+        dict: The sandbox id, the engine it runs on and the base URL its server is reachable at.
+    """
+    name = container_name(sandbox)
+    # A sandbox this server placed, or the default one, may still be running from last time.
+    # Run ids are unique, so looking for any other id on every engine would only find nothing.
+    if sandbox in sandbox_engines or sandbox == DEFAULT_SANDBOX:
+        remove_sandbox_container(sandbox_engine(sandbox), name)
+    sandbox_engines.pop(sandbox, None)
+
+    with engines.placement() as engine:
+        # The default sandbox keeps its fixed port, the others get a free one so they can share an engine
+        host_port = port if sandbox == DEFAULT_SANDBOX else None
+        labels = {SANDBOX_LABEL: sandbox}
+        network = None
+        if engine.local:
+            # Only the local engine has the compose network
+            network = "benchmarker_default"
+            labels.update({
+                "com.docker.compose.project": "benchmarker",
+                "com.docker.compose.service": "sandbox",
+            })
+
+        with metrics.docker_call("containers.run"):
+            sandbox_container = engine.client.containers.run(
+                "nikolaik/python-nodejs:python3.11-nodejs22-slim",
+                name=name,
+                working_dir="/app",
+                command="tail -f /dev/null", # To keep running when tty = False
+                ports={f'{port}/tcp': host_port},
+                mem_limit=f"{SANDBOX_MEMORY_MB}m",
+                detach=True,
+                stdout=True,
+                network=network,
+                labels=labels
+            )
+    sandbox_engines[sandbox] = engine
+    metrics.set("mcp_active_sandboxes", len(sandbox_engines))
+    logging.info(f"Started fresh container: {name} on {engine.name}")
+
+    if host_port is None:
+        with metrics.docker_call("reload"):
+            sandbox_container.reload()
+        host_port = int(sandbox_container.ports[f'{port}/tcp'][0]['HostPort'])
 
     # Clean up the workspace in container
-    print(sandbox_container)
-    print(sandbox_container.exec_run("ls"))
+    logging.info(f"{sandbox_container.name}: {sandbox_container.exec_run('ls')}")
     # Clean up the workspace on host
-    import shutil
-    for item in os.listdir(WORKDIR):
-        item_path = os.path.join(WORKDIR, item)
+    workdir = sandbox_workdir(sandbox)
+    os.makedirs(workdir, exist_ok=True)
+    for item in os.listdir(workdir):
+        item_path = os.path.join(workdir, item)
         if os.path.isfile(item_path):
             os.unlink(item_path)
         elif os.path.isdir(item_path) and item != 'node_modules':
             shutil.rmtree(item_path)
 
-    return f"Fresh container created"
+    return {"sandbox": sandbox, "engine": engine.name, "base_url": engine.base_url(host_port)}
 
 @mcp.tool
-def terminate_container():
-    global sandbox_container
-
-    try:
-        existing_container = docker_client.containers.get(CONTAINER_NAME)
-        logging.info(f"Removing existing container: {CONTAINER_NAME}")
-        # force=True sends SIGKILL and removes the container in one go
-        existing_container.remove(force=True)
-    except docker.errors.NotFound:
-        logging.info("No existing container to remove.")
+def terminate_container(sandbox: str = DEFAULT_SANDBOX):
+    """Remove a sandbox container and its workspace."""
+    remove_sandbox_container(sandbox_engine(sandbox), container_name(sandbox))
+    sandbox_engines.pop(sandbox, None)
+    metrics.set("mcp_active_sandboxes", len(sandbox_engines))
+    shutil.rmtree(sandbox_workdir(sandbox), ignore_errors=True)
+    tracing_middleware.discard(sandbox)
 
     return f"Sandbox terminated successfuly"
 
 @mcp.tool
-def list_files() -> str:
+def list_files(sandbox: str = DEFAULT_SANDBOX) -> str:
     """Lists all files in the workspace."""
     files = []
+    workdir = sandbox_workdir(sandbox)
     exclude_dirs = { "node_modules", ".git", "__pycache__", ".venv" }
-    for root, dirs, filenames in os.walk(WORKDIR):
+    for root, dirs, filenames in os.walk(workdir):
         dirs[:] = [d for d in dirs if d not in exclude_dirs]
         for f in filenames:
-            files.append(os.path.relpath(os.path.join(root, f), WORKDIR))
+            files.append(os.path.relpath(os.path.join(root, f), workdir))
     return "\n".join(files)
 
 @mcp.tool
-def read_file(path: str) -> str:
+def workspace_digest(sandbox: str = DEFAULT_SANDBOX) -> str:
     """
-    Reads the content of a file.
-
-    Args:
-        path (str): The relative path to the file.
-
-    Returns:
-        str: The content of the file or an error message if not found.
+    SHA-256 over the file paths and contents of /app in the sandbox, to tell whether anything
+    changed. Taken in the container, so edits made through exec count as well as write_file.
     """
-
-    full = os.path.join(WORKDIR, path)
-    if not os.path.isfile(full):
-        return f"Error: {path} not found"
-    return open(full, "r").read()
+    try:
+        container = get_sandbox_container(sandbox)
+        with metrics.docker_call("exec_run"):
+            result = container.exec_run(["sh", "-c", WORKSPACE_DIGEST_CMD], workdir="/app")
+        if result.exit_code == 0 and result.output.strip():
+            return result.output.split()[0].decode()
+        logging.warning(f"workspace_digest failed in {sandbox}: {result.output[:200]!r}")
+    except Exception as e:
+        logging.warning(f"workspace_digest failed in {sandbox}: {e}")
+    # An unknown workspace must never match a cached test result
+    return uuid.uuid4().hex
 
 @mcp.tool
-def write_file(path: str, content: str) -> str:
+def write_file(path: str, content: str, sandbox: str = DEFAULT_SANDBOX) -> str:
     """
     Writes content to a file.
 
@@ -216,33 +285,33 @@ def write_file(path: str, content: str) -> str:
         str: A confirmation message.
     """
 
-    full = os.path.join(WORKDIR, path)
+    full = os.path.join(sandbox_workdir(sandbox), path)
     os.makedirs(os.path.dirname(full), exist_ok=True)
     with open(full, "w") as f:
         f.write(content)
 
     # Copy the file to the container
     try:
-        copy_to_container(full)
+        copy_to_container(full, sandbox=sandbox)
     except Exception as e:
         logger.error(f"Failed to copy file to container: {e}")
 
     return "ok"
 
 @mcp.tool
-def exec(command: str) -> str:
+def exec(command: str, sandbox: str = DEFAULT_SANDBOX) -> str:
     """
     Executes a shell command in the Docker container.
     Args:
         command (str): The shell command to execute.
     Returns:
-        str: The command output.
+        str: The command output. Long output is shortened, the full text can be paged with read_output.
     """
 
-    return run_in_container(command)
+    return compact_output(run_in_container(command, sandbox=sandbox), "exec")
 
 @mcp.tool()
-def get_container_logs(tail_lines: int = 50):
+def get_container_logs(tail_lines: int = 50, sandbox: str = DEFAULT_SANDBOX):
     """
     Retrieve the most recent logs from the application container.
     Use this to debug if a command failed or to check status.
@@ -251,10 +320,34 @@ def get_container_logs(tail_lines: int = 50):
     Returns:
         Logs for the container
     """
-    container = docker_client.containers.get(CONTAINER_NAME)
+    container = get_sandbox_container(sandbox)
+
+    with metrics.docker_call("logs"):
+        logs = container.logs(tail=tail_lines, stderr=True, stdout=True)
+    return compact_output(logs.decode("utf-8", errors="replace"), "get_container_logs")
+
+@mcp.tool
+def read_output(output_id: str, page: int = 1) -> str:
+    """
+    Reads the full text of a shortened exec or log output, one page at a time.
+    Args:
+        output_id (str): The output_id given in the shortened output.
+        page (int): The page to read, starting at 1.
+    Returns:
+        str: The requested page of the output.
+    """
+    return read_output_page(output_id, page)
+
+@mcp.tool
+def trace_spans(sandbox: str = DEFAULT_SANDBOX) -> str:
+    """Returns and clears the spans recorded for a sandbox's tool calls, as JSON for the run's trace."""
+    return json.dumps(tracing_middleware.drain(sandbox))
+
 
-    logs = container.logs(tail=tail_lines, stderr=True, stdout=True)
-    return logs.decode("utf-8")
+@mcp.custom_route("/metrics", methods=["GET"])
+async def prometheus_metrics(request: Request) -> PlainTextResponse:
+    """Tool call and Docker API metrics in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 
 if __name__ == "__main__":
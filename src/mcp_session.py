@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import os
+import statistics
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from fastmcp import Client
+import tracing
+
+MCP_SERVER_URL = os.environ.get("MCP_SERVER_URL", "http://mcp_server:8000/sse")
+# "sse" talks to the mcp_server container, "inprocess" binds the FastMCP instance directly
+MCP_TRANSPORT = os.environ.get("MCP_TRANSPORT", "sse")
+MCP_POOL_SIZE = int(os.environ.get("MCP_POOL_SIZE", "4"))
+# Tool argument naming the sandbox a call acts on, filled in by the session, never by the model
+SANDBOX_ARGUMENT = "sandbox"
+
+
+def create_client(transport: str = MCP_TRANSPORT) -> Client:
+    """Create an MCP client for the given transport."""
+    if transport == "inprocess":
+        # Single-host deployments only: the tools then run inside this process and
+        # need the docker socket and the tasks/ + sandbox/ folders next to it.
+        from mcp_server import mcp
+        return Client(mcp)
+    if transport == "sse":
+        return Client(MCP_SERVER_URL)
+    raise ValueError(f"Unknown MCP transport: {transport}")
+
+
+class LatencyTracker:
+    """Keeps the most recent tool call latencies per transport and tool."""
+
+    def __init__(self, max_samples: int = 1000):
+        self.max_samples = max_samples
+        self.samples = {}
+
+    def record(self, transport: str, tool: str, seconds: float):
+        key = (transport, tool)
+        if key not in self.samples:
+            self.samples[key] = deque(maxlen=self.max_samples)
+        self.samples[key].append(seconds * 1000)
+
+    def summary(self) -> dict:
+        """Latency stats in milliseconds, grouped by transport, overall and per tool."""
+        grouped = {}
+        for (transport, tool), samples in self.samples.items():
+            entry = grouped.setdefault(transport, {"all": [], "tools": {}})
+            entry["all"].extend(samples)
+            entry["tools"][tool] = _stats(list(samples))
+
+        return {
+            transport: {**_stats(entry["all"]), "tools": entry["tools"]}
+            for transport, entry in grouped.items()
+        }
+
+
+def _stats(samples: list) -> dict:
+    ordered = sorted(samples)
+    return {
+        "calls": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered), 2),
+        "p50_ms": round(ordered[len(ordered) // 2], 2),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+        "max_ms": round(ordered[-1], 2)
+    }
+
+
+class PooledSession:
+    """
+    A connected client borrowed from the pool. Tool calls are timed, the tool list is cached.
+
+    When the session is bound to a sandbox, every call to a tool that takes a sandbox
+    argument is sent with this session's sandbox, whatever the caller passed.
+    """
+
+    def __init__(self, pool: "MCPSessionPool", client: Client, sandbox: str = None):
+        self.pool = pool
+        self.client = client
+        self.sandbox = sandbox
+
+    async def list_tools(self):
+        return await self.pool.list_tools(self.client)
+
+    async def _arguments(self, name: str, arguments: dict) -> dict:
+        arguments = dict(arguments or {})
+        if self.sandbox is not None:
+            await self.list_tools()
+            if name in self.pool.sandboxed_tools:
+                arguments[SANDBOX_ARGUMENT] = self.sandbox
+        return arguments
+
+    async def call_tool(self, name: str, arguments: dict = None):
+        arguments = await self._arguments(name, arguments)
+        start = time.perf_counter()
+        try:
+            with tracing.span(name, "tool"):
+                return await self.client.call_tool(name, arguments)
+        finally:
+            self.pool.latency.record(self.pool.transport, name, time.perf_counter() - start)
+
+    async def call_tool_mcp(self, name: str, arguments: dict):
+        arguments = await self._arguments(name, arguments)
+        start = time.perf_counter()
+        try:
+            with tracing.span(name, "tool"):
+                return await self.client.call_tool_mcp(name, arguments)
+        finally:
+            self.pool.latency.record(self.pool.transport, name, time.perf_counter() - start)
+
+
+class MCPSessionPool:
+    """
+    Long-lived MCP connections shared by consecutive tasks.
+
+    Connections are opened lazily, up to max_size at once, and returned to the pool
+    after each task instead of being torn down. The pool is bound to the event loop it
+    was first used in, so create one per asyncio.run().
+    """
+
+    def __init__(self, transport: str = MCP_TRANSPORT, max_size: int = MCP_POOL_SIZE):
+        self.transport = transport
+        self.max_size = max_size
+        self.latency = LatencyTracker()
+        self._idle = []
+        self._clients = []
+        self._tools = None
+        self.sandboxed_tools = set()
+        self._tools_lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(max_size)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _connect(self) -> Client:
+        client = create_client(self.transport)
+        await client.__aenter__()
+        self._clients.append(client)
+        logging.info(f"Opened MCP session ({self.transport}), {len(self._clients)} open")
+        return client
+
+    async def _discard(self, client: Client):
+        self._clients.remove(client)
+        try:
+            await client.__aexit__(None, None, None)
+        except Exception:
+            logging.exception("Failed to close MCP session")
+
+    @asynccontextmanager
+    async def session(self, sandbox: str = None):
+        """Borrow a connected session for the duration of the block, optionally bound to a sandbox."""
+        async with self._slots:
+            client = self._idle.pop() if self._idle else await self._connect()
+            try:
+                yield PooledSession(self, client, sandbox)
+            finally:
+                if client.is_connected():
+                    self._idle.append(client)
+                else:
+                    await self._discard(client)
+
+    async def list_tools(self, client: Client):
+        """
+        The tool list is the same for every session, fetch it once. The sandbox argument
+        is removed from the schemas so models never see it.
+        """
+        async with self._tools_lock:
+            if self._tools is None:
+                tools = []
+                for tool in await client.list_tools():
+                    properties = tool.inputSchema.get("properties", {})
+                    if SANDBOX_ARGUMENT in properties:
+                        self.sandboxed_tools.add(tool.name)
+                        schema = {
+                            **tool.inputSchema,
+                            "properties": {k: v for k, v in properties.items() if k != SANDBOX_ARGUMENT},
+                            "required": [k for k in tool.inputSchema.get("required", []) if k != SANDBOX_ARGUMENT]
+                        }
+                        # Rebuilt through the wire format, which names the field inputSchema on every SDK version
+                        tool = type(tool).model_validate({**tool.model_dump(by_alias=True), "inputSchema": schema})
+                    tools.append(tool)
+                self._tools = tools
+        return self._tools
+
+    async def close(self):
+        for client in list(self._clients):
+            await self._discard(client)
+        self._idle.clear()
+        logging.info(f"MCP latency ({self.transport}): {self.latency.summary()}")
@@ -0,0 +1,136 @@
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from fastmcp.server.middleware import Middleware
+import tracing
+
+# Upper bounds in seconds, from cached file reads up to exec's 15s timeout and beyond
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 30, 60)
+# Longest tool payload written to the log at INFO level, the full text is logged at DEBUG only
+LOG_PAYLOAD_CHARS = int(os.environ.get("LOG_PAYLOAD_CHARS", 500))
+
+METRICS = {
+    "mcp_tool_calls_total": ("counter", "Tool calls by tool and outcome."),
+    "mcp_tool_duration_seconds": ("histogram", "Tool call latency."),
+    "mcp_tool_request_bytes_total": ("counter", "Bytes of tool call arguments received."),
+    "mcp_tool_response_bytes_total": ("counter", "Bytes of tool results returned."),
+    "mcp_tool_in_flight": ("gauge", "Tool calls currently running."),
+    "mcp_active_sandboxes": ("gauge", "Sandbox containers currently running."),
+    "docker_api_duration_seconds": ("histogram", "Docker Engine API call latency."),
+    "docker_api_errors_total": ("counter", "Docker Engine API calls that raised."),
+}
+
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class MetricsRegistry:
+    """
+    In-memory counters, gauges and histograms for the metrics declared in METRICS,
+    rendered in the Prometheus text exposition format by `render`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # name -> {labels: value}, histograms hold [per bucket counts..., +Inf count, sum]
+        self.values = {name: {} for name in METRICS}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _labels(labels)
+        with self._lock:
+            self.values[name][key] = self.values[name].get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self.values[name][_labels(labels)] = value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = _labels(labels)
+        with self._lock:
+            histogram = self.values[name].setdefault(key, [0] * (len(LATENCY_BUCKETS) + 2))
+            histogram[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            histogram[-1] += seconds
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, (metric_type, description) in METRICS.items():
+                lines += [f"# HELP {name} {description}", f"# TYPE {name} {metric_type}"]
+                for labels, value in sorted(self.values[name].items()):
+                    if metric_type != "histogram":
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+                        continue
+
+                    cumulative = 0
+                    for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), value[:-1]):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {value[-1]}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    @contextmanager
+    def docker_call(self, call: str):
+        """Time a Docker API call, counting it as an error if it raises. Also traced as a span."""
+        start = time.perf_counter()
+        try:
+            with tracing.span(call, "docker"):
+                yield
+        except Exception:
+            self.inc("docker_api_errors_total", call=call)
+            raise
+        finally:
+            self.observe("docker_api_duration_seconds", time.perf_counter() - start, call=call)
+
+
+def _text_size(result) -> int:
+    return sum(len(getattr(block, "text", "").encode("utf-8")) for block in result.content)
+
+
+class ToolMetricsMiddleware(Middleware):
+    """Counts, times and sizes every tool call the MCP server handles."""
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+
+    async def on_call_tool(self, context, call_next):
+        tool = context.message.name
+        arguments = context.message.arguments or {}
+        self.registry.inc("mcp_tool_request_bytes_total", len(json.dumps(arguments).encode("utf-8")), tool=tool)
+        self.registry.inc("mcp_tool_in_flight", tool=tool)
+        start = time.perf_counter()
+        try:
+            result = await call_next(context)
+        except Exception:
+            self.registry.inc("mcp_tool_calls_total", tool=tool, status="error")
+            raise
+        finally:
+            self.registry.observe("mcp_tool_duration_seconds", time.perf_counter() - start, tool=tool)
+            self.registry.inc("mcp_tool_in_flight", -1, tool=tool)
+
+        self.registry.inc("mcp_tool_calls_total", tool=tool, status="ok")
+        self.registry.inc("mcp_tool_response_bytes_total", _text_size(result), tool=tool)
+        return result
+
+
+def log_payload(label: str, text: str, log: logging.Logger = logging.getLogger()):
+    """Log a tool payload shortened to LOG_PAYLOAD_CHARS, with the full text only at DEBUG level."""
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug(f"{label}:\n{text}")
+    elif log.isEnabledFor(logging.INFO):
+        shown = text if len(text) <= LOG_PAYLOAD_CHARS else f"{text[:LOG_PAYLOAD_CHARS]}... [{len(text) - LOG_PAYLOAD_CHARS} more chars]"
+        log.info(f"{label} ({len(text)} chars):\n{shown}")
+
+
+metrics = MetricsRegistry()
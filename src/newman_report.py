@@ -0,0 +1,68 @@
+from pathlib import Path
+import ijson
+from ijson.common import ObjectBuilder
+
+STATS_PREFIX = "run.stats"
+EXECUTION_PREFIX = "run.executions.item"
+ITEM_NAME_PREFIX = "run.executions.item.item.name"
+ASSERTION_PREFIX = "run.executions.item.assertions.item"
+
+
+def parse_newman_report(result_file: Path) -> dict:
+    """
+    Pull the run stats and per-assertion results out of a newman JSON report.
+
+    The report is streamed: only the stats object, item names and assertion objects are
+    built, so request/response bodies in large reports are never held in memory. An
+    execution's assertions are labelled once the execution ends, since its item name may
+    come after them.
+    """
+    run_stats = {}
+    details = []
+    item_name = "Unknown"
+    execution_assertions = []
+    builder = None
+    building = None
+
+    with open(result_file, "rb") as f:
+        for prefix, event, value in ijson.parse(f, use_float=True):
+            if builder is not None:
+                builder.event(event, value)
+                if event == "end_map" and prefix == building:
+                    if building == STATS_PREFIX:
+                        run_stats = builder.value
+                    else:
+                        execution_assertions.append(builder.value)
+                    builder = None
+            elif event == "start_map":
+                if prefix == STATS_PREFIX or prefix == ASSERTION_PREFIX:
+                    building = prefix
+                    builder = ObjectBuilder()
+                    builder.event(event, value)
+                elif prefix == EXECUTION_PREFIX:
+                    item_name = "Unknown"
+            elif event == "end_map" and prefix == EXECUTION_PREFIX:
+                details.extend(assertion_detail(item_name, assertion) for assertion in execution_assertions)
+                execution_assertions = []
+            elif event == "string" and prefix == ITEM_NAME_PREFIX:
+                item_name = value
+
+    assertions = run_stats.get("assertions", {})
+    total = assertions.get("total", 0)
+    failed = assertions.get("failed", 0)
+
+    return {
+        "stats": run_stats,
+        "total": total,
+        "passed": total - failed,
+        "failed": failed,
+        "details": details
+    }
+
+
+def assertion_detail(item_name: str, assertion: dict) -> dict:
+    return {
+        "name": f"{item_name}: {assertion.get('assertion', 'test')}",
+        "passed": assertion.get("error") is None,
+        "error": assertion.get("error", {}).get("message") if assertion.get("error") else None
+    }
@@ -0,0 +1,114 @@
+import os
+import re
+from artifact_store import store
+
+CHARS_PER_TOKEN = 4
+DEFAULT_TOKEN_CAP = int(os.environ.get("TOOL_OUTPUT_TOKEN_CAP", 2000))
+# Per tool overrides, e.g. "exec=3000,get_container_logs=1000"
+TOKEN_CAPS = {
+    tool.strip(): int(cap)
+    for tool, cap in (pair.split("=") for pair in os.environ.get("TOOL_OUTPUT_TOKEN_CAPS", "").split(",") if "=" in pair)
+}
+# Runs of at least this many lines that only differ in their numbers are collapsed
+MIN_REPEATS = 3
+# Share of the cap kept from the start of the output, the rest comes from the end
+HEAD_SHARE = 0.4
+
+ANSI_ESCAPE = re.compile(r"\x1b(?:\[[0-?]*[ -/]*[@-~]|\][^\x07\x1b]*(?:\x07|\x1b\\)|[@-Z\\-_])")
+CONTROL_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+NUMBERS = re.compile(r"\d+")
+OUTPUT_ID = re.compile(r"[0-9a-f]{64}")
+
+
+def token_cap(tool: str) -> int:
+    return TOKEN_CAPS.get(tool, DEFAULT_TOKEN_CAP)
+
+
+def strip_control(text: str) -> str:
+    """Remove ANSI escapes and control characters, keeping only the final state of redrawn lines."""
+    text = ANSI_ESCAPE.sub("", text)
+    if "\r" in text:
+        lines = text.split("\n")
+        for i, line in enumerate(lines):
+            # Progress bars redraw the line with \r, only what was drawn last is visible
+            if "\r" in line:
+                lines[i] = line.rstrip("\r").rsplit("\r", 1)[-1]
+        text = "\n".join(lines)
+    return CONTROL_CHARS.sub("", text)
+
+
+def collapse_repeats(text: str) -> str:
+    """Collapse runs of lines that are identical once numbers are ignored into first, marker, last."""
+    lines = text.split("\n")
+    # One pass over the whole text, replacing digits keeps the line count the same
+    keys = [key.strip() for key in NUMBERS.sub("#", text).split("\n")]
+    collapsed = []
+    i = 0
+    while i < len(lines):
+        j = i + 1
+        while j < len(lines) and keys[j] == keys[i]:
+            j += 1
+
+        run = j - i
+        if run >= MIN_REPEATS and keys[i]:
+            collapsed += [lines[i], f"[... {run - 2} similar lines ...]", lines[j - 1]]
+        elif run > 1 and not keys[i]:
+            collapsed.append("")
+        else:
+            collapsed += lines[i:j]
+        i = j
+    return "\n".join(collapsed)
+
+
+def head_tail(text: str, max_chars: int) -> tuple:
+    """Keep the start and end of text within max_chars. Returns (head, tail, omitted line count)."""
+    head = text[:int(max_chars * HEAD_SHARE)]
+    tail = text[len(text) - int(max_chars * (1 - HEAD_SHARE)):]
+    # Cut on line boundaries so no half lines reach the model
+    head = head[:head.rfind("\n") + 1] if "\n" in head else head
+    tail = tail[tail.find("\n") + 1:] if "\n" in tail else tail
+    omitted = text[len(head):len(text) - len(tail)]
+    return head, tail, omitted.count("\n")
+
+
+def compact_output(output: str, tool: str) -> str:
+    """
+    Shrink a tool result before it reaches the model.
+
+    Control sequences are always stripped. Output over the tool's token cap has its
+    repeated lines collapsed and, if still too long, is cut to its head and tail. The
+    cleaned full output is then saved to the artifact store and the marker tells the
+    agent how to page through it with read_output.
+    """
+    cleaned = strip_control(output)
+    max_chars = token_cap(tool) * CHARS_PER_TOKEN
+    if len(cleaned) <= max_chars:
+        return cleaned
+
+    compacted = collapse_repeats(cleaned)
+
+    entry = store.put_text(cleaned, f"{tool}-output.txt", "tool_output")
+    pages = -(-len(cleaned) // page_chars())
+    note = f"[Full output ({len(cleaned)} chars, {pages} pages): read_output(output_id=\"{entry['digest']}\", page=1..{pages})]"
+
+    if len(compacted) <= max_chars:
+        return f"{compacted}\n{note}"
+
+    head, tail, omitted_lines = head_tail(compacted, max_chars)
+    return f"{head}[... {omitted_lines} lines omitted ...]\n{tail}\n{note}"
+
+
+def page_chars() -> int:
+    return token_cap("read_output") * CHARS_PER_TOKEN
+
+
+def read_output_page(output_id: str, page: int) -> str:
+    if not OUTPUT_ID.fullmatch(output_id) or not store.object_path(output_id).exists():
+        return f"Error: no stored output {output_id}"
+
+    text = store.read_text(output_id)
+    size = page_chars()
+    pages = max(1, -(-len(text) // size))
+    if not 1 <= page <= pages:
+        return f"Error: page must be between 1 and {pages}"
+    return f"[page {page}/{pages}]\n{text[(page - 1) * size:page * size]}"
@@ -0,0 +1,88 @@
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from agent_guard import BUDGET_EXCEEDED, LOOPED
+
+SCOREBOARD_FILE = Path(__file__).parent / "results" / "scoreboard.json"
+
+
+@contextmanager
+def _locked():
+    # The dashboard and CLI runs can finish at the same time, don't lose either run
+    SCOREBOARD_FILE.parent.mkdir(exist_ok=True)
+    with open(SCOREBOARD_FILE.with_suffix(".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def load_scoreboard():
+    """Load scoreboard from file."""
+    if SCOREBOARD_FILE.exists():
+        with open(SCOREBOARD_FILE) as f:
+            return json.load(f)
+    return {"runs": []}
+
+
+def save_scoreboard(scoreboard):
+    """Save scoreboard to file."""
+    SCOREBOARD_FILE.parent.mkdir(exist_ok=True)
+    tmp_file = SCOREBOARD_FILE.with_suffix(".tmp")
+    with open(tmp_file, 'w') as f:
+        json.dump(scoreboard, f, indent=2)
+    os.replace(tmp_file, SCOREBOARD_FILE)
+
+
+def clear_scoreboard():
+    with _locked():
+        save_scoreboard({"runs": []})
+
+
+def save_run_to_scoreboard(model_name: str, results: list, mcp_latency: dict = None, run_id: str = None,
+                           trace: str = None):
+    """Save a benchmark run to the scoreboard. trace is the digest of the run's trace artifact."""
+    total_tests = sum(r["tests"]["total"] for r in results)
+    total_passed = sum(r["tests"]["passed"] for r in results)
+    total_failed = sum(r["tests"]["failed"] for r in results)
+
+    run_entry = {
+        "id": run_id or datetime.now().strftime("%Y%m%d_%H%M%S"),
+        "timestamp": datetime.now().isoformat(),
+        "model": model_name,
+        "summary": {
+            "tasks_run": len(results),
+            "total_tests": total_tests,
+            "passed": total_passed,
+            "failed": total_failed,
+            "pass_rate": round((total_passed / total_tests * 100), 1) if total_tests > 0 else 0,
+            "looped": sum(1 for r in results if r.get("agent_status") == LOOPED),
+            "budget_exceeded": sum(1 for r in results if r.get("agent_status") == BUDGET_EXCEEDED)
+        },
+        "task_results": [
+            {
+                "task_name": r["task_name"],
+                "agent_status": r.get("agent_status", "unknown"),
+                "agent_stop_reason": r.get("agent_stop_reason"),
+                "agent_usage": r.get("agent_usage", {}),
+                "time_to_first_green_s": r.get("time_to_first_green_s"),
+                "tests_passed": r["tests"]["passed"],
+                "tests_failed": r["tests"]["failed"],
+                "tests_total": r["tests"]["total"],
+                "artifacts": r.get("artifacts", {})
+            }
+            for r in results
+        ],
+        "mcp_latency": mcp_latency or {},
+        "trace": trace
+    }
+
+    with _locked():
+        scoreboard = load_scoreboard()
+        scoreboard["runs"].append(run_entry)
+        save_scoreboard(scoreboard)
+    return run_entry
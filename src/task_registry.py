@@ -0,0 +1,157 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+TASKS_DIR = Path(__file__).parent / "tasks"
+RUNTIMES = {"node", "python"}
+# How often, at most, the task files are stat'ed for changes
+RELOAD_CHECK_INTERVAL = 1.0
+
+REQUIRED_FIELDS = {
+    "name": str,
+    "title": str,
+    "runtime": str,
+    "framework": str,
+    "port": int,
+    "readiness_path": str,
+    "packages": list,
+}
+# Optional per-task overrides of the agent budget in agent_guard.py
+BUDGET_FIELDS = {"wall_time_s", "tokens", "tool_calls", "iterations"}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: words and punctuation marks each count as one token."""
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+
+class TaskRegistry:
+    """
+    Tasks from tasks/manifest.json with their prompts read and validated once.
+
+    Each task entry carries the manifest metadata plus its prompt text, the path of its
+    newman collection and estimated prompt token counts. The registry re-reads the files
+    when any of them changes; a broken edit is logged and the last valid state is kept.
+    """
+
+    def __init__(self, tasks_dir: Path = TASKS_DIR):
+        self.tasks_dir = Path(tasks_dir)
+        self.tasks = []
+        self.system_prompt = ""
+        self._mtimes = {}
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self.load()
+
+    def _watched_files(self) -> list:
+        return [
+            self.tasks_dir / "manifest.json",
+            *sorted((self.tasks_dir / "prompts").glob("*.md")),
+            *sorted((self.tasks_dir / "tests").glob("*.json")),
+        ]
+
+    def _snapshot(self) -> dict:
+        return {str(path): os.stat(path).st_mtime_ns for path in self._watched_files()}
+
+    def load(self):
+        """Read and validate every task. Raises ValueError listing all problems found."""
+        mtimes = self._snapshot()
+        with open(self.tasks_dir / "manifest.json", encoding="utf-8") as f:
+            manifest = json.load(f)
+        system_prompt = (self.tasks_dir / "prompts" / "system-prompt.md").read_text(encoding="utf-8")
+        system_tokens = estimate_tokens(system_prompt)
+
+        errors = []
+        tasks = []
+        for index, entry in enumerate(manifest.get("tasks", [])):
+            label = entry.get("name", f"#{index}")
+            for field, field_type in REQUIRED_FIELDS.items():
+                if not isinstance(entry.get(field), field_type):
+                    errors.append(f"{label}: '{field}' must be a {field_type.__name__}")
+            if entry.get("runtime") not in RUNTIMES:
+                errors.append(f"{label}: runtime must be one of {sorted(RUNTIMES)}")
+            budget = entry.get("budget", {})
+            if not isinstance(budget, dict) or set(budget) - BUDGET_FIELDS \
+                    or not all(isinstance(v, (int, float)) and v > 0 for v in budget.values()):
+                errors.append(f"{label}: 'budget' may only set positive numbers for {sorted(BUDGET_FIELDS)}")
+
+            prompt_file = self.tasks_dir / "prompts" / f"{label}.md"
+            test_file = self.tasks_dir / "tests" / f"{label}.json"
+            if not prompt_file.is_file():
+                errors.append(f"{label}: missing prompt {prompt_file.name}")
+                continue
+            if not test_file.is_file():
+                errors.append(f"{label}: missing test collection {test_file.name}")
+
+            prompt = prompt_file.read_text(encoding="utf-8")
+            prompt_tokens = estimate_tokens(prompt)
+            tasks.append({
+                **entry,
+                "prompt": prompt,
+                "test_file": str(test_file),
+                "tokens": {
+                    "system": system_tokens,
+                    "prompt": prompt_tokens,
+                    "total": system_tokens + prompt_tokens
+                }
+            })
+
+        names = [task["name"] for task in tasks]
+        errors.extend(f"{name}: duplicate task name" for name in set(names) if names.count(name) > 1)
+        if errors:
+            raise ValueError("Invalid task registry:\n" + "\n".join(errors))
+
+        with self._lock:
+            self.tasks = tasks
+            self.system_prompt = system_prompt
+            self._mtimes = mtimes
+        logging.info(f"Loaded {len(tasks)} tasks from {self.tasks_dir}")
+
+    def reload_if_changed(self):
+        now = time.monotonic()
+        if now - self._last_check < RELOAD_CHECK_INTERVAL:
+            return
+        self._last_check = now
+
+        try:
+            mtimes = self._snapshot()
+        except OSError:
+            # A file is being replaced, look again on the next check
+            return
+        if mtimes == self._mtimes:
+            return
+
+        try:
+            self.load()
+        except (OSError, ValueError) as e:
+            logging.error(f"Task files changed but could not be reloaded, keeping previous tasks: {e}")
+            # Don't retry until the files change again
+            self._mtimes = mtimes
+
+    def all(self) -> list:
+        self.reload_if_changed()
+        return self.tasks
+
+    def get(self, task_number: int) -> dict:
+        return self.all()[task_number]
+
+    def get_by_name(self, name: str) -> dict:
+        for task in self.all():
+            if task["name"] == name:
+                return task
+        raise KeyError(f"Unknown task: {name}")
+
+    def messages(self, task_number: int) -> list:
+        """The opening conversation for a task: system prompt then the task prompt."""
+        task = self.get(task_number)
+        return [
+            {'role': 'system', 'content': self.system_prompt},
+            {'role': 'user', 'content': task["prompt"]},
+        ]
+
+
+registry = TaskRegistry()
@@ -0,0 +1,236 @@
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from fastmcp.server.middleware import Middleware
+
+# Process lanes in the exported trace
+HARNESS = "harness"
+MCP_SERVER = "mcp_server"
+# Spans the MCP server keeps per sandbox until the harness fetches them
+MAX_BUFFERED_SPANS = 10000
+# Timeline rows per lane, outermost first
+CATEGORY_ORDER = ["run", "task", "iteration", "llm", "llm_phase", "tool", "mcp_tool", "docker", "tests"]
+# What a task waits on, one after another on its own lane
+CRITICAL_PATH = ["llm", "tool", "tests"]
+
+_tracer = contextvars.ContextVar("tracer", default=None)
+_lane = contextvars.ContextVar("trace_lane", default=None)
+
+
+def now_us() -> int:
+    # Wall clock, so spans recorded by the harness and the MCP server line up
+    return time.time_ns() // 1000
+
+
+class Tracer:
+    """
+    Collects the spans of one benchmark run and exports them as a Chrome trace.
+
+    Spans are opened with the module level `span`, which records into the tracer made
+    current by `use`. Each span sits on a lane (one per task) and nests under whatever
+    span is open on that lane, so the exported file opens in Perfetto or chrome://tracing
+    as one timeline row per task.
+    """
+
+    def __init__(self, max_spans: int = None):
+        self.spans = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def add(self, name: str, category: str, start_us: int, duration_us: int, lane: str = None,
+            process: str = HARNESS, **args):
+        with self._lock:
+            self.spans.append({
+                "name": name,
+                "cat": category,
+                "ts": start_us,
+                "dur": max(duration_us, 1),
+                "lane": lane,
+                "process": process,
+                "args": args
+            })
+
+    def add_remote(self, spans: list, lane: str, process: str = MCP_SERVER):
+        """Add spans recorded by another process, e.g. the MCP server's Docker calls."""
+        for span in spans:
+            self.add(span["name"], span["cat"], span["ts"], span["dur"], lane, process, **span["args"])
+
+    def drain(self) -> list:
+        with self._lock:
+            spans = list(self.spans)
+            self.spans.clear()
+        return spans
+
+    def export(self) -> dict:
+        """The spans in the Chrome trace event format."""
+        processes = {}
+        lanes = {}
+        events = []
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["ts"])
+        for span in spans:
+            pid = processes.setdefault(span["process"], len(processes) + 1)
+            tid = lanes.setdefault(span["lane"] or "run", len(lanes) + 1)
+            events.append({"name": span["name"], "cat": span["cat"], "ph": "X", "ts": span["ts"],
+                           "dur": span["dur"], "pid": pid, "tid": tid, "args": span["args"]})
+
+        for process, pid in processes.items():
+            events.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": process}})
+            for lane, tid in lanes.items():
+                events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": lane}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+@contextmanager
+def use(tracer: Tracer, lane: str = None):
+    """Record spans opened in this context, including tasks and threads started from it, into tracer."""
+    tracer_token = _tracer.set(tracer)
+    lane_token = _lane.set(lane)
+    try:
+        yield tracer
+    finally:
+        _lane.reset(lane_token)
+        _tracer.reset(tracer_token)
+
+
+@contextmanager
+def lane(name: str):
+    """Put the spans opened in this context on their own timeline row."""
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+class OpenSpan:
+    """A span being timed: args can be filled in while it runs, start_us and end_us are set as it opens and closes."""
+
+    def __init__(self, args: dict):
+        self.args = args
+        self.start_us = None
+        self.end_us = None
+
+
+@contextmanager
+def span(name: str, category: str, **args):
+    """
+    Time the block as a span of the current tracer. Yields an OpenSpan whose args can be
+    filled in while it runs. Only timed when a tracer is in use, otherwise does nothing.
+    """
+    current = OpenSpan(args)
+    tracer = _tracer.get()
+    if tracer is None:
+        yield current
+        return
+
+    current.start_us = now_us()
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        duration_us = int((time.perf_counter() - start) * 1e6)
+        current.end_us = current.start_us + duration_us
+        tracer.add(name, category, current.start_us, duration_us, _lane.get(), **args)
+
+
+def record(name: str, category: str, start_us: int, duration_us: int, **args):
+    """Add an already measured span to the current tracer and lane, if any."""
+    tracer = _tracer.get()
+    if tracer is not None:
+        tracer.add(name, category, start_us, duration_us, _lane.get(), **args)
+
+
+def current() -> Tracer:
+    return _tracer.get()
+
+
+class TracingMiddleware(Middleware):
+    """
+    Records every tool call the MCP server handles for a sandbox, with the Docker calls made
+    inside it, so the harness can fetch them and merge them into its trace of the run.
+    """
+
+    def __init__(self):
+        self.tracers = {}
+        self._lock = threading.Lock()
+
+    def tracer(self, sandbox: str) -> Tracer:
+        with self._lock:
+            return self.tracers.setdefault(sandbox, Tracer(MAX_BUFFERED_SPANS))
+
+    def drain(self, sandbox: str) -> list:
+        return self.tracer(sandbox).drain()
+
+    def discard(self, sandbox: str):
+        with self._lock:
+            self.tracers.pop(sandbox, None)
+
+    async def on_call_tool(self, context, call_next):
+        sandbox = (context.message.arguments or {}).get("sandbox")
+        if sandbox is None:
+            return await call_next(context)
+        with use(self.tracer(sandbox)), span(context.message.name, "mcp_tool"):
+            return await call_next(context)
+
+
+def timeline_rows(trace: dict) -> list:
+    """Flatten an exported trace into one row per span, in seconds from the start of the run."""
+    names = {}
+    for event in trace["traceEvents"]:
+        if event["ph"] == "M":
+            names[(event["name"], event["pid"], event.get("tid"))] = event["args"]["name"]
+
+    spans = [event for event in trace["traceEvents"] if event["ph"] == "X"]
+    if not spans:
+        return []
+    origin = min(event["ts"] for event in spans)
+
+    rows = []
+    for event in spans:
+        lane_name = names.get(("thread_name", event["pid"], event["tid"]), str(event["tid"]))
+        category = event["cat"]
+        rank = CATEGORY_ORDER.index(category) if category in CATEGORY_ORDER else len(CATEGORY_ORDER)
+        rows.append({
+            "lane": lane_name,
+            "row": f"{lane_name} · {category}",
+            "rank": rank,
+            "name": event["name"],
+            "category": category,
+            "process": names.get(("process_name", event["pid"], None), str(event["pid"])),
+            "start_s": round((event["ts"] - origin) / 1e6, 3),
+            "end_s": round((event["ts"] + event["dur"] - origin) / 1e6, 3),
+            "duration_s": round(event["dur"] / 1e6, 3)
+        })
+    return rows
+
+
+def row_order(rows: list) -> list:
+    """Timeline row labels with lanes in the order they started, each lane's rows outermost first."""
+    # The run's own lane starts with its first task, the outer span breaks the tie
+    lane_start = {}
+    for row in rows:
+        lane_start[row["lane"]] = min(lane_start.get(row["lane"], (row["start_s"], row["rank"])), (row["start_s"], row["rank"]))
+    return [label for *_, label in sorted({(lane_start[r["lane"]], r["lane"], r["rank"], r["row"]) for r in rows})]
+
+
+def critical_path(rows: list) -> list:
+    """
+    How each task's wall time splits between model calls, tool calls and tests. A task does
+    these one after another, so the rest is harness overhead. Live test runs happen on a
+    lane of their own, next to the agent, and are left out.
+    """
+    tasks = {}
+    for row in rows:
+        if row["category"] == "task":
+            tasks[row["lane"]] = {"task": row["lane"], "total_s": row["duration_s"], **{f"{c}_s": 0 for c in CRITICAL_PATH}}
+    for row in rows:
+        if row["process"] == HARNESS and row["lane"] in tasks and row["category"] in CRITICAL_PATH:
+            tasks[row["lane"]][f"{row['category']}_s"] += row["duration_s"]
+
+    for task in tasks.values():
+        for category in CRITICAL_PATH:
+            task[f"{category}_s"] = round(task[f"{category}_s"], 3)
+        task["other_s"] = round(task["total_s"] - sum(task[f"{c}_s"] for c in CRITICAL_PATH), 3)
+    return list(tasks.values())
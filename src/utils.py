@@ -1,19 +1,21 @@
 import time
 import requests
 
+def server_ready(url: str, timeout: float = 2) -> bool:
+    try:
+        return requests.get(url, timeout=timeout).status_code == 200
+    except requests.RequestException:
+        return False
+
 async def wait_for_server(url: str, timeout: float = 90.0, interval: float = 0.5):
 
     start = time.time()
 
     while True:
-        try:
-            response = requests.get(url, timeout=2)
-            if response.status_code == 200:
-                return
-        except:
-            pass
+        if server_ready(url):
+            return
 
         if time.time() - start > timeout:
             raise TimeoutError(f"Server not ready after {timeout} seconds")
 
-        time.sleep(interval)
\ No newline at end of file
+        time.sleep(interval)
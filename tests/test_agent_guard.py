@@ -0,0 +1,53 @@
+from agent_guard import AgentGuard, LOOPED
+
+
+def record(guard, calls):
+    for name, arguments, output in calls:
+        guard.record_tool(name, arguments, output)
+
+
+def test_rerun_after_fix_is_progress():
+    guard = AgentGuard()
+    run_app = {"command": "node app.js"}
+    record(guard, [
+        ("exec", run_app, "Error: Cannot find module 'express'"),
+        ("exec", {"command": "npm install express"}, "added 64 packages"),
+        ("exec", run_app, "ReferenceError: app is not defined"),
+        ("write_file", {"path": "app.js", "content": "const app = express()"}, "ok"),
+        ("exec", run_app, "Server listening on port 3000"),
+    ])
+    assert guard.stop_status is None
+
+
+def test_reread_after_edit_is_progress():
+    guard = AgentGuard()
+    read = {"path": "app.js"}
+    record(guard, [
+        ("read_file", read, "app.listen()"),
+        ("write_file", {"path": "app.js", "content": "app.use(express.json())\napp.listen()"}, "ok"),
+        ("read_file", read, "app.use(express.json())\napp.listen()"),
+        ("write_file", {"path": "app.js", "content": "const app = express()\napp.listen()"}, "ok"),
+        ("read_file", read, "const app = express()\napp.listen()"),
+    ])
+    assert guard.stop_status is None
+
+
+def test_same_call_and_output_is_a_loop():
+    guard = AgentGuard()
+    run_app = {"command": "node app.js"}
+    record(guard, [
+        ("exec", run_app, "Error: Cannot find module 'express'"),
+        ("list_files", {}, "app.js"),
+        ("exec", run_app, "Error: Cannot find module 'express'"),
+        ("list_files", {}, "app.js\npackage.json"),
+        ("exec", run_app, "Error: Cannot find module 'express'"),
+    ])
+    assert guard.stop_status == LOOPED
+    assert "exec called 3 times" in guard.stop_reason
+
+
+def test_output_differing_only_in_numbers_is_a_loop():
+    guard = AgentGuard()
+    install = {"command": "npm install"}
+    record(guard, [("exec", install, f"up to date, audited 65 packages in {ms}ms") for ms in (412, 387, 455)])
+    assert guard.stop_status == LOOPED
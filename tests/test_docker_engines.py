@@ -0,0 +1,67 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from benchmarks.fakes import FakeDockerClient
+from docker_engines import SANDBOX_LABEL, SANDBOX_MEMORY_MB, EnginePool
+
+
+class UnreachableClient:
+    def info(self):
+        raise ConnectionError("engine is down")
+
+
+def engine_pool(*clients):
+    pool = EnginePool([f"tcp://engine{i}:2375" for i in range(len(clients))])
+    for engine, client in zip(pool.engines, clients):
+        engine._client = client
+    return pool
+
+
+def start_sandboxes(client, count):
+    for i in range(count):
+        client.containers.run("image", name=f"sandbox_{i}", labels={SANDBOX_LABEL: str(i)})
+
+
+def test_places_on_least_loaded_engine():
+    busy, idle = FakeDockerClient(), FakeDockerClient()
+    start_sandboxes(busy, 2)
+    start_sandboxes(idle, 1)
+    assert engine_pool(busy, idle).place().name == "engine1"
+
+
+def test_skips_full_and_unreachable_engines():
+    # The full engine runs fewer containers, but has no memory left for another sandbox
+    full, roomy = FakeDockerClient(memory_mb=2 * SANDBOX_MEMORY_MB), FakeDockerClient(memory_mb=8 * SANDBOX_MEMORY_MB)
+    start_sandboxes(full, 2)
+    start_sandboxes(roomy, 3)
+    assert engine_pool(UnreachableClient(), full, roomy).place().name == "engine2"
+
+
+def test_no_reachable_engine():
+    with pytest.raises(RuntimeError):
+        engine_pool(UnreachableClient(), UnreachableClient()).place()
+
+
+def test_placement_in_progress_counts_as_running():
+    pool = engine_pool(FakeDockerClient(), FakeDockerClient())
+    with pool.placement() as first:
+        with pool.placement() as second:
+            assert first is not second
+
+
+def test_concurrent_placements_spread_across_engines():
+    pool = engine_pool(FakeDockerClient(), FakeDockerClient(), FakeDockerClient())
+    started = threading.Barrier(6)
+
+    def setup(i):
+        started.wait()
+        with pool.placement() as engine:
+            # Creating the container takes a while, the other setups must not wait for it to show up
+            time.sleep(0.05)
+            engine.client.containers.run("image", name=f"sandbox_{i}", labels={SANDBOX_LABEL: str(i)})
+        return engine.name
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        placed = list(executor.map(setup, range(6)))
+    assert sorted(placed) == ["engine0", "engine0", "engine1", "engine1", "engine2", "engine2"]
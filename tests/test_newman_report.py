@@ -0,0 +1,35 @@
+import json
+from newman_report import parse_newman_report
+
+
+def write_report(tmp_path, executions):
+    report = tmp_path / "newman.json"
+    report.write_text(json.dumps({
+        "run": {
+            "stats": {"assertions": {"total": 3, "failed": 1}},
+            "executions": executions
+        }
+    }))
+    return report
+
+
+def test_assertions_are_labelled_with_their_item(tmp_path):
+    report = write_report(tmp_path, [
+        {"item": {"name": "A"}, "assertions": [{"assertion": "s1"}, {"assertion": "s2", "error": {"message": "boom"}}]},
+        {"item": {"name": "B"}, "assertions": [{"assertion": "s3"}]},
+    ])
+    result = parse_newman_report(report)
+    assert (result["total"], result["passed"], result["failed"]) == (3, 2, 1)
+    assert result["details"] == [
+        {"name": "A: s1", "passed": True, "error": None},
+        {"name": "A: s2", "passed": False, "error": "boom"},
+        {"name": "B: s3", "passed": True, "error": None},
+    ]
+
+
+def test_item_after_assertions(tmp_path):
+    report = write_report(tmp_path, [
+        {"assertions": [{"assertion": "s1"}], "item": {"name": "A"}},
+        {"assertions": [{"assertion": "s3"}], "item": {"name": "B"}},
+    ])
+    assert [d["name"] for d in parse_newman_report(report)["details"]] == ["A: s1", "B: s3"]